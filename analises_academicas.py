@@ -4,58 +4,432 @@ Módulo de análises estatísticas para dados acadêmicos
 Desenvolvido para TCC - Sistema de Análise de Notas Acadêmicas
 """
 
+import functools
+import hashlib
+import inspect
+import io
+import os
+import glob
+import sys
+import threading
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Optional
+
+COLUNAS_NOTAS = ['Nota 1º trimestre', 'Nota 2º trimestre', 'Nota 3º trimestre']
+TRIMESTRES = ['1º Trimestre', '2º Trimestre', '3º Trimestre']
+
+# Situação do aluno numa disciplina, indexada pelo código de classificar_situacoes
+SITUACOES = np.array(['Aprovado', 'Recuperação', 'Reprovado'])
+CORES_SITUACOES = np.array(['green', 'yellow', 'red'])
+APROVADO, RECUPERACAO, REPROVADO = range(len(SITUACOES))
+LIMITE_APROVACAO = 6.0
+LIMITE_RECUPERACAO = 4.0
+LIMITE_DESTAQUE = 8.0
+
+def classificar_situacoes(medias: np.ndarray, limite_aprovacao: float = LIMITE_APROVACAO,
+                          limite_recuperacao: float = LIMITE_RECUPERACAO) -> np.ndarray:
+    """Classifica médias em 0 (Aprovado), 1 (Recuperação) ou 2 (Reprovado)"""
+    return np.where(medias >= limite_aprovacao, 0, np.where(medias >= limite_recuperacao, 1, 2))
+
+def diferenca_resumos(atual: Any, simulado: Any) -> Any:
+    """Diferença (simulado - atual) campo a campo entre dois resumos com a mesma estrutura"""
+    if isinstance(atual, dict):
+        return {chave: diferenca_resumos(atual[chave], simulado[chave]) for chave in atual}
+    if isinstance(atual, list):
+        return [diferenca_resumos(a, s) for a, s in zip(atual, simulado)]
+    if isinstance(atual, (int, float)) and not isinstance(atual, bool):
+        return round(simulado - atual, 2)
+    return atual
+
+def situacao_geral_alunos(situacoes: np.ndarray, tem_notas: np.ndarray) -> np.ndarray:
+    """Situação geral de cada aluno: a pior entre as disciplinas com nota (Aprovado se não tiver nenhuma)"""
+    if situacoes.shape[1] == 0:
+        return np.full(situacoes.shape[0], APROVADO, dtype=situacoes.dtype)
+    return np.where(tem_notas, situacoes, APROVADO).max(axis=1)
+
+def resumir_situacoes(medias: np.ndarray, tem_notas: np.ndarray, nomes_disciplinas: List[str],
+                      limite_aprovacao: float = LIMITE_APROVACAO, limite_recuperacao: float = LIMITE_RECUPERACAO,
+                      limite_destaque: float = LIMITE_DESTAQUE) -> Dict[str, Any]:
+    """Contagem de situações de alunos e disciplinas a partir das médias (alunos x disciplinas).
+
+    Só entram pares (aluno, disciplina) com nota; a situação geral do aluno é a pior entre eles.
+    """
+    if limite_recuperacao > limite_aprovacao:
+        raise ValueError("O limite de recuperação não pode ser maior que o de aprovação")
+
+    total_alunos = medias.shape[0]
+    situacoes = classificar_situacoes(medias, limite_aprovacao, limite_recuperacao)
+    alunos = np.bincount(situacao_geral_alunos(situacoes, tem_notas), minlength=len(SITUACOES)).tolist()
+
+    por_disciplina = np.stack([
+        np.count_nonzero((situacoes == codigo) & tem_notas, axis=0) for codigo in range(len(SITUACOES))
+    ] + [np.count_nonzero(tem_notas & (medias >= limite_destaque), axis=0)], axis=1).tolist()
+
+    return {
+        'total_alunos': total_alunos,
+        'aprovados': alunos[APROVADO],
+        'recuperacao': alunos[RECUPERACAO],
+        'reprovados': alunos[REPROVADO],
+        'taxa_aprovacao': round(alunos[APROVADO] / total_alunos * 100, 1) if total_alunos else 0,
+        'disciplinas': [
+            {
+                'disciplina': nomes_disciplinas[j],
+                'aprovados': aprovados,
+                'recuperacao': recuperacao,
+                'reprovados': reprovados,
+                'destaques': destaques
+            }
+            for j, (aprovados, recuperacao, reprovados, destaques) in enumerate(por_disciplina)
+        ]
+    }
+
+def bytes_estrutura(estrutura: Any) -> int:
+    """Memória aproximada dos contêineres (dict, list, tuple) de uma estrutura, sem as strings e números"""
+    if isinstance(estrutura, dict):
+        return sys.getsizeof(estrutura) + sum(bytes_estrutura(c) + bytes_estrutura(v) for c, v in estrutura.items())
+    if isinstance(estrutura, (list, tuple)):
+        return sys.getsizeof(estrutura) + sum(bytes_estrutura(item) for item in estrutura)
+    return 0
+
+def classificar_trimestre(percentuais: List[float]) -> Tuple[int, str, List[int]]:
+    """Trimestre em andamento, status e trimestres completos a partir do percentual de notas lançadas"""
+    # Considera completo se > 80% preenchido
+    trimestres_completos = [t for t, percentual in enumerate(percentuais, 1) if percentual > 80]
+
+    if 3 in trimestres_completos:
+        # Todos os 3 trimestres completos
+        return 3, "Ano Letivo Completo", trimestres_completos
+    if 2 in trimestres_completos:
+        # Apenas 1º e 2º completos (está no 2º trimestre)
+        return 2, "2º Trimestre em Andamento", trimestres_completos
+    # Apenas 1º completo ou nenhum completo
+    return 1, "1º Trimestre em Andamento", trimestres_completos
+
+# Critérios aceitos por ranking_melhores_alunos
+CRITERIOS_RANKING = ('media_geral', 'disciplinas_aprovado', 'disciplinas_recuperacao', 'disciplinas_reprovado')
+
+# Quantidade máxima de resultados memorizados por analisador
+TAMANHO_MAXIMO_CACHE = 256
+
+def memorizar(metodo):
+    """Memoriza o resultado de um método do analisador.
+
+    A chave combina a versão dos dados (hash da planilha) com os argumentos já
+    normalizados, então chamadas posicionais e nomeadas compartilham a entrada.
+    Os resultados são compartilhados entre chamadas e não devem ser alterados.
+    Acima de TAMANHO_MAXIMO_CACHE entradas sai a usada há mais tempo (LRU).
+    """
+    assinatura = inspect.signature(metodo)
+
+    @functools.wraps(metodo)
+    def wrapper(self, *args, **kwargs):
+        argumentos = assinatura.bind(self, *args, **kwargs)
+        argumentos.apply_defaults()
+        chave = (metodo.__name__, self.versao_dados, tuple(argumentos.arguments.values())[1:])
+        try:
+            with self._lock_cache:
+                resultado = self._cache[chave]
+                self._cache.move_to_end(chave)
+                return resultado
+        except KeyError:
+            pass
+        except TypeError:
+            # Argumentos não hasheáveis: calcula sem memorizar
+            return metodo(self, *args, **kwargs)
+
+        # Calculado fora do lock; duas threads podem calcular a mesma entrada, vale a última
+        resultado = metodo(self, *args, **kwargs)
+        with self._lock_cache:
+            self._cache[chave] = resultado
+            self._cache.move_to_end(chave)
+            while len(self._cache) > TAMANHO_MAXIMO_CACHE:
+                self._cache.popitem(last=False)
+        return resultado
+
+    return wrapper
+
+# Cache colunar das planilhas (.npz ao lado do .xlsx), evita reprocessar com openpyxl
+DIRETORIO_CACHE_PLANILHAS = '.cache'
+VERSAO_FORMATO_CACHE = 2
+
+def caminho_cache_planilha(caminho_planilha: str, versao_dados: str) -> str:
+    """Retorna o caminho do arquivo de cache de uma planilha para uma versão (hash) dos dados"""
+    diretorio, arquivo = os.path.split(os.path.abspath(caminho_planilha))
+    nome_base = os.path.splitext(arquivo)[0]
+    return os.path.join(diretorio, DIRETORIO_CACHE_PLANILHAS, f"{nome_base}.{versao_dados[:16]}.npz")
+
+def salvar_cache_planilha(df: pd.DataFrame, caminho_cache: str):
+    """Grava o DataFrame em formato colunar (.npz sem pickle) e remove versões antigas"""
+    colunas = {'formato': np.array(VERSAO_FORMATO_CACHE), 'colunas': np.array(df.columns.astype(str), dtype=str)}
+    for i, coluna in enumerate(df.columns):
+        serie = df[coluna]
+        if isinstance(serie.dtype, np.dtype) and serie.dtype.kind in 'biuf':
+            # Inteiros, booleanos e reais mantêm o dtype lido da planilha
+            colunas[f'c{i}'] = serie.to_numpy()
+        elif pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_object_dtype(serie):
+            colunas[f'c{i}'] = serie.to_numpy(dtype=float, na_value=np.nan)
+        else:
+            nulos = serie.isna().to_numpy()
+            colunas[f'c{i}'] = np.array(serie.astype(object).where(~nulos, '').astype(str), dtype=str)
+            colunas[f'n{i}'] = nulos
+
+    os.makedirs(os.path.dirname(caminho_cache), exist_ok=True)
+    temporario = caminho_cache + '.tmp'
+    with open(temporario, 'wb') as arquivo:
+        np.savez(arquivo, **colunas)
+    os.replace(temporario, caminho_cache)
+
+    # Versões anteriores da mesma planilha não serão mais lidas
+    prefixo = caminho_cache.rsplit('.', 2)[0]
+    for antigo in glob.glob(glob.escape(prefixo) + '.*.npz'):
+        if antigo != caminho_cache:
+            os.remove(antigo)
+
+def ler_cache_planilha(caminho_cache: str) -> pd.DataFrame:
+    """Reconstrói o DataFrame a partir do cache colunar"""
+    with np.load(caminho_cache, allow_pickle=False) as dados:
+        if int(dados['formato']) != VERSAO_FORMATO_CACHE:
+            raise ValueError('Formato de cache desatualizado')
+
+        colunas = {}
+        for i, coluna in enumerate(dados['colunas'].tolist()):
+            valores = dados[f'c{i}']
+            if f'n{i}' in dados:
+                valores = valores.astype(object)
+                valores[dados[f'n{i}']] = np.nan
+                colunas[coluna] = pd.Series(valores).infer_objects()
+            else:
+                colunas[coluna] = valores
+    return pd.DataFrame(colunas)
+
+def ler_planilha(caminho_planilha: str, conteudo: bytes, versao_dados: str) -> Tuple[pd.DataFrame, bool]:
+    """Lê a planilha pelo cache colunar quando disponível; caso contrário usa openpyxl.
+
+    Retorna o DataFrame e se ele veio do cache. O cache não é gravado aqui: quem lê
+    grava (gravar_cache_planilha) só depois de os dados se mostrarem válidos.
+    """
+    caminho_cache = caminho_cache_planilha(caminho_planilha, versao_dados)
+    if os.path.exists(caminho_cache):
+        try:
+            return ler_cache_planilha(caminho_cache), True
+        except Exception as e:
+            print(f"Cache inválido para {caminho_planilha}, relendo planilha: {e}")
+
+    return pd.read_excel(io.BytesIO(conteudo), engine='openpyxl'), False
+
+def gravar_cache_planilha(caminho_planilha: str, df: pd.DataFrame, versao_dados: str):
+    """Grava o cache colunar de uma versão da planilha (e descarta as anteriores); falhas só são avisadas"""
+    try:
+        salvar_cache_planilha(df, caminho_cache_planilha(caminho_planilha, versao_dados))
+    except Exception as e:
+        print(f"Não foi possível gravar o cache de {caminho_planilha}: {e}")
 
 class AnalisadorAcademico:
     """Classe para análises estatísticas de dados acadêmicos"""
     
-    def __init__(self, caminho_planilha: str = 'notas_certa.xlsx'):
-        """Inicializa o analisador com a planilha de notas"""
-        self.df = pd.read_excel(caminho_planilha, engine='openpyxl')
+    def __init__(self, caminho_planilha: str = 'notas_certa.xlsx', compacto: bool = False,
+                 conteudo: Optional[bytes] = None):
+        """Inicializa o analisador com a planilha de notas.
+
+        No modo compacto o DataFrame guarda nomes e disciplinas como categorias e
+        notas em float32; as estatísticas continuam sendo calculadas em float64.
+        Se conteudo for informado, ele é usado no lugar do arquivo em caminho_planilha
+        (que pode ainda não existir), permitindo preparar uma nova versão antes de gravá-la.
+        """
+        self.caminho_planilha = caminho_planilha
+        self.compacto = compacto
+        self._cache = OrderedDict()
+        self._lock_cache = threading.Lock()
+        self.carregar_dados(conteudo)
+
+    def carregar_dados(self, conteudo: Optional[bytes] = None):
+        """Lê a planilha, atualiza a versão dos dados e descarta resultados memorizados"""
+        if conteudo is None:
+            with open(self.caminho_planilha, 'rb') as arquivo:
+                conteudo = arquivo.read()
+
+        self.versao_dados = hashlib.sha256(conteudo).hexdigest()
+        df, do_cache = ler_planilha(self.caminho_planilha, conteudo, self.versao_dados)
+        # O DataFrame é alterado abaixo; a versão lida fica intacta para o cache
+        self.df = df if do_cache else df.copy()
+        self._normalizar_notas()
         self.disciplinas = self.df['Disciplina'].unique()
         self.alunos = self.df['Nome'].unique()
-        
+        self._construir_tensor_notas()
+        self._construir_situacoes()
+        if self.compacto:
+            self._compactar_dataframe()
+        self.limpar_cache()
+
+        # Só uma planilha que gerou um analisador válido grava o cache (e descarta o da versão anterior)
+        if not do_cache:
+            gravar_cache_planilha(self.caminho_planilha, df, self.versao_dados)
+
+    def _compactar_dataframe(self):
+        """Reduz a memória do DataFrame (o tensor de notas já foi montado em float64)"""
+        for col in ('Nome', 'Disciplina'):
+            self.df[col] = self.df[col].astype('category')
+        self.df[COLUNAS_NOTAS] = self.df[COLUNAS_NOTAS].astype(np.float32)
+
+    def relatorio_memoria(self) -> Dict[str, Any]:
+        """Memória aproximada (em bytes) ocupada pelos dados da turma"""
+        dataframe = int(self.df.memory_usage(deep=True).sum())
+        matrizes = sum(matriz.nbytes for matriz in (
+            self.notas, self.notas_validas, self.notas_validas_tensor, self.matriculado,
+            self.contagem_notas, self.tem_notas, self.medias, self.situacoes,
+            self.contagem_situacoes
+        ))
+        # Índices em dicionários e listas (os nomes são os mesmos objetos de self.alunos/self.disciplinas)
+        indices = sum(bytes_estrutura(estrutura) for estrutura in (
+            self.indice_alunos, self.indice_disciplinas, self.indice_nomes_disciplinas, self.nomes_disciplinas,
+            self.disciplinas_reprovadas
+        ))
+        return {
+            'compacto': self.compacto,
+            'linhas': len(self.df),
+            'dataframe_bytes': dataframe,
+            'matrizes_bytes': int(matrizes),
+            'indices_bytes': indices,
+            'total_bytes': dataframe + int(matrizes) + indices,
+            'resultados_memorizados': len(self._cache)
+        }
+
+    def limpar_cache(self):
+        """Descarta todos os resultados memorizados"""
+        with self._lock_cache:
+            self._cache.clear()
+
+    def __getstate__(self):
+        """Ao serializar (ex.: retorno de processos de carga) não envia resultados memorizados nem o lock"""
+        estado = self.__dict__.copy()
+        estado['_cache'] = OrderedDict()
+        del estado['_lock_cache']
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock_cache = threading.Lock()
+
+    def _normalizar_notas(self):
+        """Converte as colunas de notas para float, com NaN para notas ausentes.
+
+        Valores vazios, não numéricos ou zero são tratados como nota ausente; o
+        resultado é registrado em self.notas_validas (linhas × trimestres).
+        """
+        for col in COLUNAS_NOTAS:
+            if col in self.df.columns:
+                notas = pd.to_numeric(self.df[col], errors='coerce').astype(float)
+                self.df[col] = notas.mask(notas == 0)
+            else:
+                self.df[col] = np.nan
+
+        self.notas_validas = self.df[COLUNAS_NOTAS].notna().to_numpy()
+
+    def _construir_tensor_notas(self):
+        """Monta o tensor denso de notas (alunos × disciplinas × trimestres) e os índices de acesso.
+
+        Se um par (aluno, disciplina) aparecer em mais de uma linha, vale a primeira ocorrência.
+        """
+        self.indice_alunos = {aluno: i for i, aluno in enumerate(self.alunos)}
+        self.indice_disciplinas = {disciplina: j for j, disciplina in enumerate(self.disciplinas)}
+        self.nomes_disciplinas = [
+            disciplina.split(' - ')[1] if isinstance(disciplina, str) and ' - ' in disciplina else disciplina
+            for disciplina in self.disciplinas
+        ]
+
+        # Posição de cada linha da planilha no tensor
+        linha_aluno = pd.Index(self.alunos).get_indexer(self.df['Nome'])
+        linha_disciplina = pd.Index(self.disciplinas).get_indexer(self.df['Disciplina'])
+
+        notas_linhas = self.df[COLUNAS_NOTAS].to_numpy(dtype=float)
+
+        # Primeira linha de cada par (aluno, disciplina)
+        validas = (linha_aluno >= 0) & (linha_disciplina >= 0)
+        linhas = np.flatnonzero(validas)
+        chave = linha_aluno[linhas] * len(self.disciplinas) + linha_disciplina[linhas]
+        _, primeiras = np.unique(chave, return_index=True)
+        linhas = linhas[primeiras]
+
+        self.notas = np.full((len(self.alunos), len(self.disciplinas), len(COLUNAS_NOTAS)), np.nan)
+        self.notas[linha_aluno[linhas], linha_disciplina[linhas]] = notas_linhas[linhas]
+        self.matriculado = np.zeros((len(self.alunos), len(self.disciplinas)), dtype=bool)
+        self.matriculado[linha_aluno[linhas], linha_disciplina[linhas]] = True
+
+        # Nome simples da disciplina (maiúsculo) -> índice; vale a primeira ocorrência
+        self.indice_nomes_disciplinas = {}
+        for j, nome_disc in enumerate(self.nomes_disciplinas):
+            if isinstance(nome_disc, str):
+                self.indice_nomes_disciplinas.setdefault(nome_disc.upper(), j)
+
+        # Médias por (aluno, disciplina); 0.0 quando não há nenhuma nota válida
+        self.notas_validas_tensor = ~np.isnan(self.notas)
+        self.contagem_notas = np.count_nonzero(self.notas_validas_tensor, axis=2)
+        self.tem_notas = self.contagem_notas > 0
+        soma = np.nansum(self.notas, axis=2)
+        self.medias = np.divide(soma, self.contagem_notas,
+                                out=np.zeros_like(soma), where=self.tem_notas)
+
+    def _construir_situacoes(self):
+        """Materializa a situação de cada (aluno, disciplina) e as disciplinas reprovadas de cada aluno.
+
+        Disciplina sem nenhuma nota conta como Reprovado em situacoes, mas é ignorada na
+        situação geral do aluno (ver situacao_geral_alunos).
+        """
+        self.situacoes = classificar_situacoes(self.medias).astype(np.int8)
+        self.contagem_situacoes = np.stack(
+            [np.count_nonzero(self.situacoes == codigo, axis=1) for codigo in range(len(SITUACOES))], axis=1)
+
+        # Aluno -> disciplinas em que está reprovado (só alunos com alguma reprovação)
+        reprovados_i, reprovados_j = np.nonzero(self.situacoes == REPROVADO)
+        self.disciplinas_reprovadas = {}
+        for i, j in zip(reprovados_i.tolist(), reprovados_j.tolist()):
+            self.disciplinas_reprovadas.setdefault(self.alunos[i], []).append(self.nomes_disciplinas[j])
+
+    @staticmethod
+    def _soma_sequencial(matriz: np.ndarray) -> np.ndarray:
+        """Soma por linha na mesma ordem de um laço Python (evita divergências de arredondamento)"""
+        if matriz.shape[1] == 0:
+            return np.zeros(matriz.shape[0])
+        return np.cumsum(matriz, axis=1)[:, -1]
+
     def calcular_media_aluno(self, nome_aluno: str, disciplina: str = None) -> float:
         """Calcula a média de um aluno específico, ignorando valores vazios/NaN"""
-        filtro = self.df['Nome'] == nome_aluno
-        if disciplina:
-            filtro = filtro & (self.df['Disciplina'] == disciplina)
-
-        dados_aluno = self.df[filtro]
-        if dados_aluno.empty:
+        i = self.indice_alunos.get(nome_aluno)
+        if i is None:
             return 0.0
 
-        # Coletar notas, ignorando NaN e valores vazios
-        notas = []
-        for col in ['Nota 1º trimestre', 'Nota 2º trimestre', 'Nota 3º trimestre']:
-            valores = dados_aluno[col].values
-            for v in valores:
-                if pd.notna(v) and v != '' and v != 0:
-                    notas.append(float(v))
+        if disciplina:
+            j = self.indice_disciplinas.get(disciplina)
+            if j is None:
+                return 0.0
+            return self.medias[i, j]
 
-        if not notas:
+        total_notas = self.contagem_notas[i].sum()
+        if not total_notas:
             return 0.0
 
-        return np.mean(notas)
+        return np.nansum(self.notas[i]) / total_notas
     
+    def obter_notas(self, nome_aluno: str, disciplina: str) -> Optional[List[Optional[float]]]:
+        """Retorna as notas dos três trimestres de um aluno numa disciplina (None = sem nota).
+
+        Retorna None se o aluno não cursa a disciplina.
+        """
+        i = self.indice_alunos.get(nome_aluno)
+        j = self.indice_disciplinas.get(disciplina)
+        if i is None or j is None or not self.matriculado[i, j]:
+            return None
+        return [None if np.isnan(nota) else float(nota) for nota in self.notas[i, j]]
+
+    @memorizar
     def calcular_media_disciplina(self, disciplina: str) -> Dict[str, float]:
         """Calcula estatísticas de uma disciplina específica, ignorando valores vazios"""
-        dados_disciplina = self.df[self.df['Disciplina'] == disciplina]
-
-        # Calcular média de cada aluno na disciplina
-        medias_alunos = []
-        for _, row in dados_disciplina.iterrows():
-            notas = []
-            for col in ['Nota 1º trimestre', 'Nota 2º trimestre', 'Nota 3º trimestre']:
-                if pd.notna(row[col]) and row[col] != '' and row[col] != 0:
-                    notas.append(float(row[col]))
-
-            if notas:
-                medias_alunos.append(np.mean(notas))
+        j = self.indice_disciplinas.get(disciplina)
+        medias_alunos = self.medias[self.tem_notas[:, j], j] if j is not None else np.empty(0)
 
-        if not medias_alunos:
+        if not len(medias_alunos):
             return {
                 'media_geral': 0.0,
                 'mediana': 0.0,
@@ -73,169 +447,135 @@ class AnalisadorAcademico:
             'nota_minima': np.min(medias_alunos),
             'total_alunos': len(medias_alunos)
         }
+
+    def _alunos_por_disciplina(self, mascara: np.ndarray) -> Dict[str, List[str]]:
+        """Converte uma máscara (alunos × disciplinas) em listas de nomes por disciplina"""
+        return {
+            disciplina: self.alunos[np.flatnonzero(mascara[:, j])].tolist()
+            for j, disciplina in enumerate(self.disciplinas)
+        }
     
+    @memorizar
     def identificar_alunos_dificuldade(self, limite: float = 6.0) -> Dict[str, List[str]]:
         """Identifica alunos com dificuldades (média abaixo do limite)"""
-        alunos_dificuldade = {}
-
-        for disciplina in self.disciplinas:
-            dados_disciplina = self.df[self.df['Disciplina'] == disciplina]
-            alunos_baixo_rendimento = []
-
-            for _, row in dados_disciplina.iterrows():
-                # Coletar apenas notas válidas
-                notas = []
-                for col in ['Nota 1º trimestre', 'Nota 2º trimestre', 'Nota 3º trimestre']:
-                    if pd.notna(row[col]) and row[col] != '' and row[col] != 0:
-                        notas.append(float(row[col]))
-
-                if notas:  # Só calcular se houver notas válidas
-                    media = np.mean(notas)
-                    if media < limite:
-                        alunos_baixo_rendimento.append(row['Nome'])
-
-            alunos_dificuldade[disciplina] = alunos_baixo_rendimento
-
-        return alunos_dificuldade
+        # Só considera alunos com ao menos uma nota válida na disciplina
+        return self._alunos_por_disciplina(self.tem_notas & (self.medias < limite))
 
+    @memorizar
     def alunos_destaque(self, limite: float = 8.0) -> Dict[str, List[str]]:
         """Identifica alunos com destaque (média acima do limite)"""
-        alunos_destaque = {}
-
-        for disciplina in self.disciplinas:
-            dados_disciplina = self.df[self.df['Disciplina'] == disciplina]
-            alunos_alto_rendimento = []
-
-            for _, row in dados_disciplina.iterrows():
-                # Coletar apenas notas válidas
-                notas = []
-                for col in ['Nota 1º trimestre', 'Nota 2º trimestre', 'Nota 3º trimestre']:
-                    if pd.notna(row[col]) and row[col] != '' and row[col] != 0:
-                        notas.append(float(row[col]))
-
-                if notas:  # Só calcular se houver notas válidas
-                    media = np.mean(notas)
-                    if media >= limite:
-                        alunos_alto_rendimento.append(row['Nome'])
-
-            alunos_destaque[disciplina] = alunos_alto_rendimento
-
-        return alunos_destaque
+        return self._alunos_por_disciplina(self.tem_notas & (self.medias >= limite))
 
     def ranking_disciplinas_dificeis(self) -> List[Tuple[str, float, int]]:
         """Retorna ranking das disciplinas mais difíceis (maior % de alunos com dificuldade)"""
-        ranking = []
-        alunos_dificuldade = self.identificar_alunos_dificuldade()
-        
-        for disciplina in self.disciplinas:
-            total_alunos = len(self.df[self.df['Disciplina'] == disciplina])
-            alunos_com_dificuldade = len(alunos_dificuldade[disciplina])
-            percentual = (alunos_com_dificuldade / total_alunos) * 100
-            
-            ranking.append((disciplina, percentual, alunos_com_dificuldade))
-        
-        # Ordenar por percentual decrescente
-        ranking.sort(key=lambda x: x[1], reverse=True)
-        return ranking
+        return list(self.relatorio_completo()['ranking_dificuldade'])
     
     def desempenho_por_trimestre(self) -> Dict[str, Dict[str, float]]:
         """Analisa o desempenho médio por trimestre, ignorando valores vazios"""
-        resultado = {}
+        return {
+            disciplina: dict(medias)
+            for disciplina, medias in self.relatorio_completo()['desempenho_trimestres'].items()
+        }
 
-        for disciplina in self.disciplinas:
-            dados_disciplina = self.df[self.df['Disciplina'] == disciplina]
+    @memorizar
+    def relatorio_completo(self) -> Dict[str, Any]:
+        """Calcula de uma só vez relatório geral, ranking de dificuldade, destaques e médias por trimestre.
 
-            # Calcular médias ignorando NaN e valores vazios
-            media_1tri = dados_disciplina['Nota 1º trimestre'].replace('', np.nan).replace(0, np.nan).astype(float).mean()
-            media_2tri = dados_disciplina['Nota 2º trimestre'].replace('', np.nan).replace(0, np.nan).astype(float).mean()
-            media_3tri = dados_disciplina['Nota 3º trimestre'].replace('', np.nan).replace(0, np.nan).astype(float).mean()
+        O resultado é memorizado e compartilhado pelas APIs do dashboard.
+        """
+        total_alunos = len(self.alunos)
+        total_disciplinas = len(self.disciplinas)
 
-            resultado[disciplina] = {
-                '1º Trimestre': media_1tri if pd.notna(media_1tri) else 0.0,
-                '2º Trimestre': media_2tri if pd.notna(media_2tri) else 0.0,
-                '3º Trimestre': media_3tri if pd.notna(media_3tri) else 0.0
-            }
+        dificuldade = self.tem_notas & (self.medias < 6.0)
+        destaque = self.tem_notas & (self.medias >= 8.0)
 
-        return resultado
-    
+        # Ranking das disciplinas por percentual de alunos com dificuldade
+        com_dificuldade = np.count_nonzero(dificuldade, axis=0)
+        alunos_disciplina = np.count_nonzero(self.matriculado, axis=0)
+        ranking = [
+            (disciplina, float(com_dificuldade[j] / alunos_disciplina[j] * 100), int(com_dificuldade[j]))
+            for j, disciplina in enumerate(self.disciplinas)
+        ]
+        ranking.sort(key=lambda x: x[1], reverse=True)
 
+        # Médias por disciplina em cada trimestre
+        contagem = np.count_nonzero(self.notas_validas_tensor, axis=0)
+        soma = np.nansum(self.notas, axis=0)
+        medias_trimestre = np.divide(soma, contagem, out=np.zeros_like(soma), where=contagem > 0)
+
+        total_com_dificuldade = int(com_dificuldade.sum())
+
+        return {
+            'relatorio_geral': {
+                'total_alunos': total_alunos,
+                'total_disciplinas': total_disciplinas,
+                'media_geral_turma': np.mean(self.medias),
+                'total_avaliacoes_com_dificuldade': total_com_dificuldade,
+                'percentual_dificuldade': (total_com_dificuldade / (total_alunos * total_disciplinas)) * 100,
+                'disciplina_mais_dificil': ranking[0][0],
+                'disciplina_mais_facil': ranking[-1][0]
+            },
+            'ranking_dificuldade': ranking,
+            'alunos_dificuldade': self._alunos_por_disciplina(dificuldade),
+            'alunos_destaque': self._alunos_por_disciplina(destaque),
+            'desempenho_trimestres': {
+                disciplina: {trimestre: float(medias_trimestre[j, t]) for t, trimestre in enumerate(TRIMESTRES)}
+                for j, disciplina in enumerate(self.disciplinas)
+            }
+        }
     
     def relatorio_geral_turma(self) -> Dict[str, Any]:
         """Gera relatório geral da turma"""
-        total_alunos = len(self.alunos)
-        total_disciplinas = len(self.disciplinas)
-        
-        # Calcular média geral da turma
-        todas_medias = []
-        for aluno in self.alunos:
-            for disciplina in self.disciplinas:
-                media_aluno_disciplina = self.calcular_media_aluno(aluno, disciplina)
-                todas_medias.append(media_aluno_disciplina)
-        
-        alunos_dificuldade = self.identificar_alunos_dificuldade()
-        total_com_dificuldade = sum(len(alunos) for alunos in alunos_dificuldade.values())
-        
-        return {
-            'total_alunos': total_alunos,
-            'total_disciplinas': total_disciplinas,
-            'media_geral_turma': np.mean(todas_medias),
-            'total_avaliacoes_com_dificuldade': total_com_dificuldade,
-            'percentual_dificuldade': (total_com_dificuldade / (total_alunos * total_disciplinas)) * 100,
-            'disciplina_mais_dificil': self.ranking_disciplinas_dificeis()[0][0],
-            'disciplina_mais_facil': self.ranking_disciplinas_dificeis()[-1][0]
-        }
+        return dict(self.relatorio_completo()['relatorio_geral'])
     
+    @memorizar
     def alunos_precisam_atencao(self, min_reprovacoes: int = 3, limite_nota: float = 6.0) -> List[Dict[str, Any]]:
         """Identifica alunos que precisam de atenção especial (reprovados em múltiplas disciplinas)"""
-        alunos_atencao = []
-
-        for aluno in self.alunos:
-            disciplinas_reprovado = []
-            disciplinas_recuperacao = []
-            disciplinas_aprovado = []
-            total_media = 0
-
-            for disciplina in self.disciplinas:
-                media = self.calcular_media_aluno(aluno, disciplina)
-                total_media += media
+        reprovado = self.situacoes == REPROVADO
+        if limite_nota == LIMITE_APROVACAO:
+            recuperacao = self.situacoes == RECUPERACAO
+            total_recuperacoes = self.contagem_situacoes[:, RECUPERACAO]
+        else:
+            recuperacao = ~reprovado & (self.medias < limite_nota)
+            total_recuperacoes = np.count_nonzero(recuperacao, axis=1)
+        aprovado = ~reprovado & ~recuperacao
 
-                nome_disciplina = disciplina.split(' - ')[1] if ' - ' in disciplina else disciplina
+        total_reprovacoes = self.contagem_situacoes[:, REPROVADO]
+        total_problemas = total_reprovacoes + total_recuperacoes
+        medias_gerais = self._soma_sequencial(self.medias) / len(self.disciplinas)
 
-                if media < 4.0:
-                    disciplinas_reprovado.append(nome_disciplina)
-                elif media < limite_nota:
-                    disciplinas_recuperacao.append(nome_disciplina)
-                else:
-                    disciplinas_aprovado.append(nome_disciplina)
+        # Critérios para atenção especial
+        selecionados = ((total_reprovacoes >= min_reprovacoes) |
+                        (total_problemas >= min_reprovacoes) |
+                        (medias_gerais < 5.0))
 
-            media_geral = total_media / len(self.disciplinas)
-            total_problemas = len(disciplinas_reprovado) + len(disciplinas_recuperacao)
-
-            # Critérios para atenção especial
-            if (len(disciplinas_reprovado) >= min_reprovacoes or
-                total_problemas >= min_reprovacoes or
-                media_geral < 5.0):
+        alunos_atencao = []
+        for i in np.flatnonzero(selecionados):
+            media_geral = medias_gerais[i]
+            disciplinas_reprovado = list(self.disciplinas_reprovadas.get(self.alunos[i], []))
+            disciplinas_recuperacao = [self.nomes_disciplinas[j] for j in np.flatnonzero(recuperacao[i])]
+            disciplinas_aprovado = [self.nomes_disciplinas[j] for j in np.flatnonzero(aprovado[i])]
+
+            # Determinar nível de prioridade
+            if len(disciplinas_reprovado) >= 5 or media_geral < 4.0:
+                prioridade = "Crítica"
+            elif len(disciplinas_reprovado) >= 3 or media_geral < 5.0:
+                prioridade = "Alta"
+            else:
+                prioridade = "Média"
 
-                # Determinar nível de prioridade
-                if len(disciplinas_reprovado) >= 5 or media_geral < 4.0:
-                    prioridade = "Crítica"
-                elif len(disciplinas_reprovado) >= 3 or media_geral < 5.0:
-                    prioridade = "Alta"
-                else:
-                    prioridade = "Média"
-
-                alunos_atencao.append({
-                    'nome': aluno,
-                    'media_geral': round(media_geral, 2),
-                    'disciplinas_reprovado': disciplinas_reprovado,
-                    'disciplinas_recuperacao': disciplinas_recuperacao,
-                    'disciplinas_aprovado': disciplinas_aprovado,
-                    'total_reprovacoes': len(disciplinas_reprovado),
-                    'total_recuperacoes': len(disciplinas_recuperacao),
-                    'total_aprovacoes': len(disciplinas_aprovado),
-                    'total_problemas': total_problemas,
-                    'prioridade': prioridade
-                })
+            alunos_atencao.append({
+                'nome': self.alunos[i],
+                'media_geral': round(media_geral, 2),
+                'disciplinas_reprovado': disciplinas_reprovado,
+                'disciplinas_recuperacao': disciplinas_recuperacao,
+                'disciplinas_aprovado': disciplinas_aprovado,
+                'total_reprovacoes': len(disciplinas_reprovado),
+                'total_recuperacoes': len(disciplinas_recuperacao),
+                'total_aprovacoes': len(disciplinas_aprovado),
+                'total_problemas': int(total_problemas[i]),
+                'prioridade': prioridade
+            })
 
         # Ordenar por prioridade, depois por nome (ordem alfabética/numérica)
         prioridade_ordem = {"Crítica": 0, "Alta": 1, "Média": 2}
@@ -243,131 +583,119 @@ class AnalisadorAcademico:
 
         return alunos_atencao
 
-    def ranking_melhores_alunos(self, limite: int = 10) -> List[Dict[str, Any]]:
-        """Gera ranking dos alunos com melhores médias gerais"""
-        ranking_alunos = []
+    @staticmethod
+    def _selecionar_primeiros(chave: np.ndarray, k: int) -> np.ndarray:
+        """Índices dos k menores valores de chave, em ordem (empates pela posição original).
+
+        Faz seleção parcial com argpartition e só ordena os candidatos, não o vetor inteiro.
+        """
+        if k <= 0:
+            return np.array([], dtype=np.intp)
+        if k >= len(chave):
+            return np.argsort(chave, kind='stable')
+
+        limiar = chave[np.argpartition(chave, k - 1)[k - 1]]
+        # Todos os empatados com o k-ésimo entram como candidatos para o desempate ser estável
+        candidatos = np.flatnonzero(chave <= limiar)
+        return candidatos[np.argsort(chave[candidatos], kind='stable')][:k]
+
+    @memorizar
+    def ranking_melhores_alunos(self, limite: int = 10, deslocamento: int = 0,
+                                ordem: str = 'desc', criterio: str = 'media_geral') -> List[Dict[str, Any]]:
+        """Gera ranking dos alunos por média geral ou por número de disciplinas em cada situação.
+
+        ordem='desc' lista os melhores primeiro e 'asc' os piores; limite/deslocamento paginam o resultado.
+        """
+        if criterio not in CRITERIOS_RANKING:
+            raise ValueError(f"Critério de ranking inválido: {criterio}")
+        if ordem not in ('asc', 'desc'):
+            raise ValueError(f"Ordem de ranking inválida: {ordem}")
 
-        for aluno in self.alunos:
-            disciplinas_info = []
-            total_media = 0
-            disciplinas_aprovado = 0
-            disciplinas_recuperacao = 0
-            disciplinas_reprovado = 0
-
-            for disciplina in self.disciplinas:
-                media = self.calcular_media_aluno(aluno, disciplina)
-                total_media += media
-
-                nome_disciplina = disciplina.split(' - ')[1] if ' - ' in disciplina else disciplina
-
-                disciplinas_info.append({
-                    'nome': nome_disciplina,
-                    'media': round(media, 2)
-                })
-
-                # Classificar desempenho
-                if media >= 6.0:
-                    disciplinas_aprovado += 1
-                elif media >= 4.0:
-                    disciplinas_recuperacao += 1
-                else:
-                    disciplinas_reprovado += 1
+        total_disciplinas = len(self.disciplinas)
+        medias_gerais = self._soma_sequencial(self.medias) / total_disciplinas if total_disciplinas else np.zeros(len(self.alunos))
+
+        # Classificar desempenho
+        disciplinas_aprovado = self.contagem_situacoes[:, APROVADO]
+        disciplinas_recuperacao = self.contagem_situacoes[:, RECUPERACAO]
+        disciplinas_reprovado = self.contagem_situacoes[:, REPROVADO]
+        contagens = {
+            'disciplinas_aprovado': disciplinas_aprovado,
+            'disciplinas_recuperacao': disciplinas_recuperacao,
+            'disciplinas_reprovado': disciplinas_reprovado,
+        }
+
+        # Chave inteira: média geral em centésimos, precedida pela contagem quando o critério é uma situação
+        chave = np.round(np.round(medias_gerais, 2) * 100).astype(np.int64)
+        if criterio != 'media_geral':
+            chave = contagens[criterio].astype(np.int64) * 100_000 + chave
+        if ordem == 'desc':
+            chave = -chave
 
-            media_geral = total_media / len(self.disciplinas)
+        deslocamento = max(deslocamento, 0)
+        ordem_alunos = self._selecionar_primeiros(chave, deslocamento + max(limite, 0))[deslocamento:]
 
-            # Ordenar disciplinas por média (melhores primeiro)
-            disciplinas_info.sort(key=lambda x: x['media'], reverse=True)
+        # Detalhe por disciplina apenas para os alunos da página
+        medias_arredondadas = np.round(self.medias[ordem_alunos], 2)
+        ordem_disciplinas = np.argsort(-medias_arredondadas, axis=1, kind='stable')
+
+        ranking_alunos = []
+        for linha, i in enumerate(ordem_alunos):
+            disciplinas_info = [
+                {'nome': self.nomes_disciplinas[j], 'media': medias_arredondadas[linha, j]}
+                for j in ordem_disciplinas[linha]
+            ]
 
             ranking_alunos.append({
-                'nome': aluno,
-                'media_geral': round(media_geral, 2),
+                'nome': self.alunos[i],
+                'media_geral': round(medias_gerais[i], 2),
                 'disciplinas': disciplinas_info,
-                'total_disciplinas': len(self.disciplinas),
-                'disciplinas_aprovado': disciplinas_aprovado,
-                'disciplinas_recuperacao': disciplinas_recuperacao,
-                'disciplinas_reprovado': disciplinas_reprovado,
+                'total_disciplinas': total_disciplinas,
+                'disciplinas_aprovado': int(disciplinas_aprovado[i]),
+                'disciplinas_recuperacao': int(disciplinas_recuperacao[i]),
+                'disciplinas_reprovado': int(disciplinas_reprovado[i]),
                 'melhor_disciplina': disciplinas_info[0]['nome'] if disciplinas_info else None,
                 'melhor_nota': disciplinas_info[0]['media'] if disciplinas_info else 0,
                 'pior_disciplina': disciplinas_info[-1]['nome'] if disciplinas_info else None,
-                'pior_nota': disciplinas_info[-1]['media'] if disciplinas_info else 0
+                'pior_nota': disciplinas_info[-1]['media'] if disciplinas_info else 0,
+                'posicao': deslocamento + linha + 1
             })
 
-        # Ordenar por média geral (melhores primeiro)
-        ranking_alunos.sort(key=lambda x: x['media_geral'], reverse=True)
-
-        # Adicionar posição no ranking
-        for i, aluno in enumerate(ranking_alunos[:limite], 1):
-            aluno['posicao'] = i
-
-        return ranking_alunos[:limite]
+        return ranking_alunos
 
+    @memorizar
     def consulta_disciplina(self, nome_disciplina: str) -> Dict[str, Any]:
         """Consulta detalhada de uma disciplina com todos os alunos"""
 
         # Encontrar a disciplina exata
-        disciplina_encontrada = None
-        for disciplina in self.disciplinas:
-            nome_disc = disciplina.split(' - ')[1] if ' - ' in disciplina else disciplina
-            if nome_disc.upper() == nome_disciplina.upper():
-                disciplina_encontrada = disciplina
-                break
-
-        if not disciplina_encontrada:
+        j = self.indice_nomes_disciplinas.get(nome_disciplina.upper())
+        if j is None:
             return {'erro': 'Disciplina não encontrada'}
 
-        # Coletar dados de todos os alunos nesta disciplina
-        alunos_disciplina = []
-        medias_disciplina = []
-
-        for aluno in self.alunos:
-            media = self.calcular_media_aluno(aluno, disciplina_encontrada)
-            medias_disciplina.append(media)
-
-            # Buscar notas por trimestre
-            notas_trimestres = []
-            for trimestre in ['1º trimestre', '2º trimestre', '3º trimestre']:
-                col_nota = f'Nota {trimestre}'
-                if col_nota in self.df.columns:
-                    filtro = (self.df['Nome'] == aluno) & (self.df['Disciplina'] == disciplina_encontrada)
-                    if len(self.df[filtro]) > 0:
-                        nota = self.df[filtro][col_nota].iloc[0]
-                        # Validar se a nota é válida
-                        if pd.notna(nota) and nota != '' and nota != 0:
-                            notas_trimestres.append(float(nota))
-                        else:
-                            notas_trimestres.append(None)  # Usar None para indicar ausência de nota
-                    else:
-                        notas_trimestres.append(None)
-                else:
-                    notas_trimestres.append(None)
-
-            # Determinar status
-            if media >= 6.0:
-                status = 'Aprovado'
-                cor = 'green'
-            elif media >= 4.0:
-                status = 'Recuperação'
-                cor = 'yellow'
-            else:
-                status = 'Reprovado'
-                cor = 'red'
-
-            alunos_disciplina.append({
-                'nome': aluno,
-                'media': round(media, 2),
-                'notas_trimestres': notas_trimestres,
-                'status': status,
-                'cor': cor
-            })
+        disciplina_encontrada = self.disciplinas[j]
+        medias_disciplina = self.medias[:, j]
+        medias_arredondadas = np.round(medias_disciplina, 2)
+
+        # Classificar todos os alunos de uma vez (0 = Aprovado, 1 = Recuperação, 2 = Reprovado)
+        situacoes = classificar_situacoes(medias_disciplina)
+        contagem_situacoes = np.bincount(situacoes, minlength=len(SITUACOES))
 
         # Ordenar alunos por média (melhores primeiro)
-        alunos_disciplina.sort(key=lambda x: x['media'], reverse=True)
+        ordem = np.argsort(-medias_arredondadas, kind='stable')
+
+        alunos_disciplina = [
+            {'nome': nome, 'media': media, 'notas_trimestres': notas_aluno, 'status': status, 'cor': cor}
+            for nome, media, notas_aluno, status, cor in zip(
+                self.alunos[ordem].tolist(),
+                medias_arredondadas[ordem].tolist(),
+                # None no lugar de NaN, montado só para a disciplina consultada
+                np.where(self.notas_validas_tensor[ordem, j, :], self.notas[ordem, j, :], None).tolist(),
+                SITUACOES[situacoes[ordem]].tolist(),
+                CORES_SITUACOES[situacoes[ordem]].tolist()
+            )
+        ]
 
         # Calcular estatísticas da disciplina
-        media_geral_disciplina = sum(medias_disciplina) / len(medias_disciplina) if medias_disciplina else 0
-        aprovados = sum(1 for a in alunos_disciplina if a['status'] == 'Aprovado')
-        recuperacao = sum(1 for a in alunos_disciplina if a['status'] == 'Recuperação')
-        reprovados = sum(1 for a in alunos_disciplina if a['status'] == 'Reprovado')
+        media_geral_disciplina = np.cumsum(medias_disciplina)[-1] / len(medias_disciplina) if len(medias_disciplina) else 0
 
         # Melhor e pior aluno
         melhor_aluno = alunos_disciplina[0] if alunos_disciplina else None
@@ -378,64 +706,27 @@ class AnalisadorAcademico:
             'disciplina_completa': disciplina_encontrada,
             'media_geral': round(media_geral_disciplina, 2),
             'total_alunos': len(alunos_disciplina),
-            'aprovados': aprovados,
-            'recuperacao': recuperacao,
-            'reprovados': reprovados,
+            'aprovados': int(contagem_situacoes[0]),
+            'recuperacao': int(contagem_situacoes[1]),
+            'reprovados': int(contagem_situacoes[2]),
             'melhor_aluno': melhor_aluno,
             'pior_aluno': pior_aluno,
             'alunos': alunos_disciplina
         }
 
+    @memorizar
     def detectar_trimestre_atual(self) -> Dict[str, Any]:
         """Detecta qual trimestre está em andamento baseado nas notas disponíveis"""
         # Contar quantas notas válidas existem em cada trimestre
         total_registros = len(self.df)
-
-        notas_1tri = 0
-        notas_2tri = 0
-        notas_3tri = 0
-
-        for _, row in self.df.iterrows():
-            if pd.notna(row['Nota 1º trimestre']) and row['Nota 1º trimestre'] != '' and row['Nota 1º trimestre'] != 0:
-                notas_1tri += 1
-            if pd.notna(row['Nota 2º trimestre']) and row['Nota 2º trimestre'] != '' and row['Nota 2º trimestre'] != 0:
-                notas_2tri += 1
-            if pd.notna(row['Nota 3º trimestre']) and row['Nota 3º trimestre'] != '' and row['Nota 3º trimestre'] != 0:
-                notas_3tri += 1
+        notas_1tri, notas_2tri, notas_3tri = np.count_nonzero(self.notas_validas, axis=0)
 
         # Calcular percentuais
         perc_1tri = (notas_1tri / total_registros * 100) if total_registros > 0 else 0
         perc_2tri = (notas_2tri / total_registros * 100) if total_registros > 0 else 0
         perc_3tri = (notas_3tri / total_registros * 100) if total_registros > 0 else 0
 
-        # Determinar trimestre atual (considera completo se > 80% preenchido)
-        trimestre_atual = 1
-        trimestres_completos = []
-
-        if perc_1tri > 80:
-            trimestres_completos.append(1)
-        if perc_2tri > 80:
-            trimestres_completos.append(2)
-        if perc_3tri > 80:
-            trimestres_completos.append(3)
-
-        # Determinar trimestre atual baseado nos trimestres completos
-        if 3 in trimestres_completos:
-            # Todos os 3 trimestres completos
-            trimestre_atual = 3
-            status = "Ano Letivo Completo"
-        elif 2 in trimestres_completos:
-            # Apenas 1º e 2º completos (está no 2º trimestre)
-            trimestre_atual = 2
-            status = "2º Trimestre em Andamento"
-        elif 1 in trimestres_completos:
-            # Apenas 1º completo (está no 1º trimestre)
-            trimestre_atual = 1
-            status = "1º Trimestre em Andamento"
-        else:
-            # Nenhum trimestre completo
-            trimestre_atual = 1
-            status = "1º Trimestre em Andamento"
+        trimestre_atual, status, trimestres_completos = classificar_trimestre([perc_1tri, perc_2tri, perc_3tri])
 
         return {
             'trimestre_atual': trimestre_atual,
@@ -445,13 +736,59 @@ class AnalisadorAcademico:
                 '1º Trimestre': round(perc_1tri, 1),
                 '2º Trimestre': round(perc_2tri, 1),
                 '3º Trimestre': round(perc_3tri, 1)
+            },
+            'cobertura_disciplinas': self._cobertura_disciplinas(trimestre_atual)
+        }
+
+    def _cobertura_disciplinas(self, trimestre_atual: int) -> List[Dict[str, Any]]:
+        """Percentual de notas lançadas por disciplina e trimestre, da menos para a mais preenchida"""
+        matriculados = np.count_nonzero(self.matriculado, axis=0)
+        lancadas = np.count_nonzero(self.notas_validas_tensor, axis=0)
+        percentuais = np.divide(lancadas * 100, matriculados[:, None],
+                                out=np.zeros(lancadas.shape), where=matriculados[:, None] > 0)
+
+        # Mais atrasadas primeiro no trimestre em andamento
+        ordem = np.argsort(percentuais[:, trimestre_atual - 1], kind='stable')
+        return [
+            {
+                'disciplina': self.nomes_disciplinas[j],
+                'total_alunos': int(matriculados[j]),
+                'percentuais': dict(zip(TRIMESTRES, np.round(percentuais[j], 1).tolist()))
             }
+            for j in ordem
+        ]
+
+    def resumo_situacoes(self, limite_aprovacao: float = LIMITE_APROVACAO,
+                         limite_recuperacao: float = LIMITE_RECUPERACAO,
+                         limite_destaque: float = LIMITE_DESTAQUE) -> Dict[str, Any]:
+        """Contagem de situações de alunos e disciplinas sob os limites informados"""
+        return resumir_situacoes(self.medias, self.tem_notas, self.nomes_disciplinas,
+                                 limite_aprovacao, limite_recuperacao, limite_destaque)
+
+    @memorizar
+    def simular_limites(self, limite_aprovacao: float = LIMITE_APROVACAO,
+                        limite_recuperacao: float = LIMITE_RECUPERACAO,
+                        limite_destaque: float = LIMITE_DESTAQUE) -> Dict[str, Any]:
+        """Reclassifica a turma sob outros limites e compara com as regras atuais"""
+        atual = self.resumo_situacoes()
+        simulado = self.resumo_situacoes(limite_aprovacao, limite_recuperacao, limite_destaque)
+        return {
+            'limites': {
+                'aprovacao': limite_aprovacao,
+                'recuperacao': limite_recuperacao,
+                'destaque': limite_destaque
+            },
+            'atual': atual,
+            'simulado': simulado,
+            'diferenca': diferenca_resumos(atual, simulado)
         }
 
+    @memorizar
     def dados_para_graficos(self) -> Dict[str, Any]:
         """Prepara dados estruturados para geração de gráficos"""
-        ranking_dificuldade = self.ranking_disciplinas_dificeis()
-        desempenho_trimestres = self.desempenho_por_trimestre()
+        relatorio = self.relatorio_completo()
+        ranking_dificuldade = relatorio['ranking_dificuldade']
+        desempenho_trimestres = relatorio['desempenho_trimestres']
 
         return {
             'disciplinas': [item[0].split(' - ')[1] if ' - ' in item[0] else item[0] for item in ranking_dificuldade],
@@ -461,6 +798,143 @@ class AnalisadorAcademico:
             'total_alunos': len(self.alunos)
         }
 
+    @memorizar
+    def contexto_chatbot(self) -> str:
+        """Resumo da turma em texto, enviado ao Gemini junto com as perguntas do chatbot"""
+        relatorio = self.relatorio_geral_turma()
+
+        # Estatísticas de aprovação/reprovação (todos os pares aluno × disciplina)
+        aprovados, recuperacao, reprovados = (int(total) for total in self.contagem_situacoes.sum(axis=0))
+
+        # Ranking dos melhores alunos pela média das disciplinas com média > 0
+        com_media = self.medias > 0
+        quantidade_medias = com_media.sum(axis=1)
+        soma_medias = self._soma_sequencial(np.where(com_media, self.medias, 0.0))
+        aprovacoes = (self.medias >= 6.0).sum(axis=1)
+        ranqueados = np.flatnonzero(quantidade_medias)
+        media_geral = soma_medias[ranqueados] / quantidade_medias[ranqueados]
+        ordem = np.argsort(-media_geral, kind='stable')
+
+        # Top 5 melhores
+        ranking_melhores = "\n".join([
+            f"  {posicao + 1}. {self.alunos[ranqueados[k]]}: média {media_geral[k]:.2f} ({aprovacoes[ranqueados[k]]} aprovações)"
+            for posicao, k in enumerate(ordem[:5])
+        ])
+
+        # Obter alunos que precisam de atenção
+        alunos_atencao = self.alunos_precisam_atencao(min_reprovacoes=2)
+        lista_atencao = "\n".join([
+            f"  - {aluno['nome']}: média {aluno['media_geral']:.2f} ({aluno['total_reprovacoes']} reprovações, prioridade {aluno['prioridade']})"
+            for aluno in alunos_atencao[:5]  # Limitar a 5
+        ])
+
+        # Obter desempenho por disciplina COM alunos com dificuldade
+        disciplinas_info = []
+        alunos_dificuldade_por_disc = self.identificar_alunos_dificuldade()
+        quantidade_por_disc = com_media.sum(axis=0)
+        soma_por_disc = self._soma_sequencial(np.where(com_media, self.medias, 0.0).T)
+
+        for j, disciplina in enumerate(self.disciplinas):
+            nome_disc = disciplina.replace('Disciplina - ', '')
+
+            if quantidade_por_disc[j]:
+                media_disc = soma_por_disc[j] / quantidade_por_disc[j]
+
+                # Obter alunos com dificuldade nesta disciplina
+                alunos_dif = alunos_dificuldade_por_disc.get(disciplina, [])
+                qtd_dif = len(alunos_dif)
+
+                if qtd_dif > 0:
+                    # Mostrar apenas os 3 primeiros alunos para não sobrecarregar
+                    nomes_dif = ", ".join(alunos_dif[:3])
+                    if qtd_dif > 3:
+                        nomes_dif += f" e mais {qtd_dif - 3}"
+                    disciplinas_info.append(f"  - {nome_disc}: média {media_disc:.2f} ({qtd_dif} alunos com dificuldade: {nomes_dif})")
+                else:
+                    disciplinas_info.append(f"  - {nome_disc}: média {media_disc:.2f} (sem alunos com dificuldade)")
+
+        disciplinas_texto = "\n".join(disciplinas_info[:10])  # Limitar a 10
+
+        # Obter evolução por trimestre (calcular média geral de cada trimestre)
+        desempenho_por_disc = self.desempenho_por_trimestre()
+
+        # Calcular média geral de cada trimestre
+        trim1_valores = []
+        trim2_valores = []
+        trim3_valores = []
+
+        for disciplina, trimestres in desempenho_por_disc.items():
+            if trimestres['1º Trimestre'] > 0:
+                trim1_valores.append(trimestres['1º Trimestre'])
+            if trimestres['2º Trimestre'] > 0:
+                trim2_valores.append(trimestres['2º Trimestre'])
+            if trimestres['3º Trimestre'] > 0:
+                trim3_valores.append(trimestres['3º Trimestre'])
+
+        trim1 = sum(trim1_valores) / len(trim1_valores) if trim1_valores else 0.0
+        trim2 = sum(trim2_valores) / len(trim2_valores) if trim2_valores else 0.0
+        trim3 = sum(trim3_valores) / len(trim3_valores) if trim3_valores else 0.0
+
+        # Criar texto de evolução baseado nos dados disponíveis
+        if trim3 > 0:  # Tem todos os 3 trimestres
+            evolucao_texto = f"""  - 1º Trimestre: média {trim1:.2f}
+  - 2º Trimestre: média {trim2:.2f}
+  - 3º Trimestre: média {trim3:.2f}"""
+        elif trim2 > 0:  # Tem apenas 1º e 2º
+            evolucao_texto = f"""  - 1º Trimestre: média {trim1:.2f}
+  - 2º Trimestre: média {trim2:.2f}
+  - 3º Trimestre: não disponível (ainda não concluído)"""
+        else:  # Tem apenas 1º
+            evolucao_texto = f"""  - 1º Trimestre: média {trim1:.2f}
+  - 2º Trimestre: não disponível (ainda não concluído)
+  - 3º Trimestre: não disponível (ainda não concluído)"""
+
+        if trim3 > 0:  # Se tem 3º trimestre
+            if trim3 > trim2 > trim1:
+                tendencia = "📈 Melhora constante ao longo do ano"
+            elif trim3 < trim2 < trim1:
+                tendencia = "📉 Queda constante ao longo do ano"
+            elif trim3 > trim1:
+                tendencia = "📈 Melhora geral (3º > 1º)"
+            elif trim3 < trim1:
+                tendencia = "📉 Queda geral (3º < 1º)"
+            else:
+                tendencia = "➡️ Desempenho estável"
+        elif trim2 > 0:  # Se tem apenas 1º e 2º trimestre
+            if trim2 > trim1:
+                tendencia = "📈 Melhora do 1º para o 2º trimestre"
+            elif trim2 < trim1:
+                tendencia = "📉 Queda do 1º para o 2º trimestre"
+            else:
+                tendencia = "➡️ Desempenho estável"
+        else:
+            tendencia = "Apenas 1º trimestre disponível"
+
+        return f"""
+DADOS DA TURMA ATUAL:
+- Total de alunos: {relatorio['total_alunos']}
+- Total de disciplinas: {relatorio['total_disciplinas']}
+- Média geral da turma: {relatorio['media_geral_turma']:.2f}
+- Aprovações: {aprovados}
+- Em recuperação: {recuperacao}
+- Reprovações: {reprovados}
+- Disciplina mais difícil: {relatorio['disciplina_mais_dificil'].replace('Disciplina - ', '')}
+- Disciplina mais fácil: {relatorio['disciplina_mais_facil'].replace('Disciplina - ', '')}
+
+EVOLUÇÃO AO LONGO DOS TRIMESTRES:
+{evolucao_texto}
+Tendência: {tendencia}
+
+TOP 5 MELHORES ALUNOS:
+{ranking_melhores}
+
+ALUNOS QUE PRECISAM DE ATENÇÃO:
+{lista_atencao if lista_atencao else "  Nenhum aluno com 2+ reprovações"}
+
+DESEMPENHO POR DISCIPLINA:
+{disciplinas_texto}
+"""
+
 # Função de conveniência para uso direto
 def analisar_dados_academicos(caminho_planilha: str = 'notas_certa.xlsx') -> AnalisadorAcademico:
     """Função de conveniência para criar um analisador"""
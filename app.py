@@ -1,27 +1,49 @@
 from flask import Flask, request, jsonify, render_template, redirect, url_for, session
-import pandas as pd
+import numpy as np
 import google.generativeai as genai
 from dotenv import load_dotenv
 import os
-from analises_academicas import AnalisadorAcademico
+import math
+import atexit
+from analises_academicas import (CRITERIOS_RANKING, LIMITE_APROVACAO,
+                                 LIMITE_RECUPERACAO, LIMITE_DESTAQUE, APROVADO, RECUPERACAO, REPROVADO)
 from gerenciador_turmas import GerenciadorTurmas
 from gerenciador_contas import GerenciadorContas
+from cache_respostas import CacheRespostas, MAX_RESPOSTAS, VALIDADE_RESPOSTAS
+from fila_tarefas import FilaTarefas, MAX_TRABALHADORES, MAX_PENDENTES
 
 import plotly.graph_objs as go
 import plotly.utils
 import json
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity, get_jwt
+from flask_jwt_extended import (JWTManager, jwt_required, create_access_token, get_jwt_identity, get_jwt,
+                                verify_jwt_in_request)
 from datetime import timedelta
-import hashlib
 import time
 
 # Carrega as variáveis de ambiente e configura a API Key
 load_dotenv()
 genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
 
-# Cache para respostas do Gemini
-gemini_cache = {}
-CACHE_EXPIRATION = 3600  # 1 hora em segundos
+# Cache de respostas do Gemini, separado por turma (CACHE_RESPOSTAS_SQLITE grava em disco e
+# compartilha as respostas entre processos)
+cache_respostas = CacheRespostas(
+    max_respostas=int(os.getenv('CACHE_RESPOSTAS_MAX', str(MAX_RESPOSTAS))),
+    validade=float(os.getenv('CACHE_RESPOSTAS_VALIDADE', str(VALIDADE_RESPOSTAS))),
+    caminho_sqlite=os.getenv('CACHE_RESPOSTAS_SQLITE') or None
+)
+
+# Chamadas ao Gemini rodam em segundo plano; as rotas devolvem o id da tarefa e o cliente consulta
+# /api/tarefas/<id> até a resposta ficar pronta. Com CACHE_RESPOSTAS_SQLITE o estado das tarefas
+# fica no mesmo arquivo, e a consulta funciona em qualquer processo
+fila_tarefas = FilaTarefas(
+    max_trabalhadores=int(os.getenv('TRABALHADORES_IA', str(MAX_TRABALHADORES))),
+    max_pendentes=int(os.getenv('MAX_TAREFAS_IA', str(MAX_PENDENTES))),
+    caminho_sqlite=os.getenv('CACHE_RESPOSTAS_SQLITE') or None
+)
+atexit.register(fila_tarefas.encerrar)
+
+# Segundos máximos de cada chamada ao Gemini (uma chamada presa não segura a tarefa para sempre)
+TEMPO_LIMITE_GEMINI = float(os.getenv('TEMPO_LIMITE_GEMINI', '60'))
 
 # Flag para desabilitar Gemini temporariamente se houver problemas de quota
 GEMINI_ENABLED = True
@@ -40,71 +62,71 @@ app.config['JWT_COOKIE_SECURE'] = False  # True em produção com HTTPS
 app.config['JWT_COOKIE_CSRF_PROTECT'] = False  # Simplificar para desenvolvimento
 jwt = JWTManager(app)
 
-# Inicializar gerenciadores
-gerenciador_turmas = GerenciadorTurmas()
+# Inicializar gerenciadores (PROCESSOS_CARGA_TURMAS > 1 ativa a carga paralela de planilhas;
+# TEMPO_LIMITE_TURMA, em segundos, deixa de fora das comparações a turma que demorar mais para carregar)
+gerenciador_turmas = GerenciadorTurmas(
+    processos_carregamento=int(os.getenv('PROCESSOS_CARGA_TURMAS', '0')),
+    tempo_limite_turma=float(os.getenv('TEMPO_LIMITE_TURMA', '0')) or None
+)
 gerenciador_contas = GerenciadorContas()
+# Processos de carga de planilhas são liberados ao encerrar a aplicação
+atexit.register(gerenciador_turmas.encerrar)
 
-# Variável global para armazenar o analisador da turma ativa
-analisador = None
-contexto = ""
+def obter_analisador_ativo():
+    """Retorna o analisador da turma ativa na sessão do usuário (ou None).
+
+    Os analisadores vêm do registro compartilhado do gerenciador de turmas, de modo
+    que vários usuários olhando a mesma turma usam a mesma instância carregada.
+    """
+    nome_turma = session.get('turma_ativa')
+    if not nome_turma:
+        return None
+    return gerenciador_turmas.obter_turma(nome_turma)
 
 def obter_analisador_turma(nome_turma=None):
-    """Obtém o analisador para uma turma específica"""
-    global analisador, contexto
+    """Obtém o analisador para uma turma específica.
 
-    if nome_turma:
-        # Carregar turma específica
-        arquivo = gerenciador_turmas.obter_arquivo_turma(nome_turma)
-        if arquivo:
-            try:
-                analisador = AnalisadorAcademico(arquivo)
-                df = analisador.df
-                contexto = df.to_string(index=False)
+    Reaproveita a instância já carregada no registro; o contexto do chatbot só é
+    montado quando uma pergunta é feita.
+    """
+    if not nome_turma:
+        return obter_analisador_ativo()
+    return gerenciador_turmas.obter_turma(gerenciador_turmas.normalizar_nome_turma(nome_turma))
 
-                # Criar contexto enriquecido com análises
-                relatorio = analisador.relatorio_geral_turma()
-                ranking_dificuldade = analisador.ranking_disciplinas_dificeis()
+# Prompt especializado para análise acadêmica (chatbot)
+MODELO_PERGUNTA = """Você é um assistente especializado em análise de dados acadêmicos do IFC.
 
-                contexto_enriquecido = f"""
-DADOS DA PLANILHA:
 {contexto}
 
-ANÁLISES ESTATÍSTICAS:
-- Total de alunos: {relatorio['total_alunos']}
-- Total de disciplinas: {relatorio['total_disciplinas']}
-- Média geral da turma: {relatorio['media_geral_turma']:.2f}
-- Percentual com dificuldade: {relatorio['percentual_dificuldade']:.1f}%
-- Disciplina mais difícil: {relatorio['disciplina_mais_dificil']}
-- Disciplina mais fácil: {relatorio['disciplina_mais_facil']}
+INSTRUÇÕES:
+- Você TEM ACESSO COMPLETO aos dados acima, incluindo:
+  * Estatísticas gerais da turma
+  * Evolução por trimestre
+  * Ranking dos melhores alunos (com nomes)
+  * Alunos que precisam de atenção (com nomes)
+  * Desempenho por disciplina (com nomes dos alunos com dificuldade em cada disciplina)
+- As notas variam de 0 a 10
+- Média mínima para aprovação: 6.0
+- Recuperação: 4.0 a 5.9
+- Reprovação: abaixo de 4.0
+- Quando perguntarem sobre alunos com dificuldade em uma disciplina específica, USE os dados de "DESEMPENHO POR DISCIPLINA" que mostram os nomes dos alunos
+- Você pode analisar a evolução das notas ao longo dos trimestres
+- Seja CONCISO e DIRETO nas respostas (máximo 3 parágrafos curtos)
+- SEMPRE cite nomes específicos de alunos quando disponíveis nos dados
+- Se a pergunta for sobre um aluno específico que não está na lista, informe que precisa de mais detalhes
 
-RANKING DE DIFICULDADE (Top 5):
-"""
-                for i, (disciplina, percentual, total) in enumerate(ranking_dificuldade[:5], 1):
-                    nome_disciplina = disciplina.split(' - ')[1] if ' - ' in disciplina else disciplina
-                    contexto_enriquecido += f"{i}. {nome_disciplina}: {percentual:.1f}% ({total} alunos com dificuldade)\n"
+PERGUNTA: {pergunta}
 
-                contexto = contexto_enriquecido
-                return analisador
-            except Exception as e:
-                print(f"Erro ao carregar turma {nome_turma}: {e}")
-                return None
+RESPOSTA:"""
 
-    return analisador
+def chave_pergunta(pergunta, analisador=None):
+    """Chave do cache: modelo do prompt, versão dos dados da turma e pergunta normalizada"""
+    return cache_respostas.chave(MODELO_PERGUNTA, analisador.versao_dados if analisador else None, pergunta)
 
-def fazer_pergunta_gemini(pergunta, contexto):
+def fazer_pergunta_gemini(pergunta, analisador=None):
+    """Gera a resposta do chatbot e guarda no cache (executada pela fila de tarefas)"""
     try:
-        # Criar hash da pergunta para cache
-        cache_key = hashlib.md5(pergunta.encode()).hexdigest()
-
-        # Verificar se a resposta está em cache e ainda é válida
-        if cache_key in gemini_cache:
-            cached_data = gemini_cache[cache_key]
-            if time.time() - cached_data['timestamp'] < CACHE_EXPIRATION:
-                print(f"✅ Resposta recuperada do cache para: {pergunta[:50]}...")
-                return cached_data['response']
-            else:
-                # Cache expirado, remover
-                del gemini_cache[cache_key]
+        cache_key = chave_pergunta(pergunta, analisador)
 
         # Usar modelo mais rápido e configurar para respostas otimizadas
         model = genai.GenerativeModel(
@@ -117,195 +139,14 @@ def fazer_pergunta_gemini(pergunta, contexto):
             }
         )
 
-        # Criar resumo do contexto ao invés de enviar tudo
+        # Resumo da turma montado só quando o chatbot precisa dele
         if analisador:
-            relatorio = analisador.relatorio_geral_turma()
-
-            # Calcular estatísticas de aprovação/reprovação
-            aprovados = 0
-            recuperacao = 0
-            reprovados = 0
-
-            for aluno in analisador.alunos:
-                for disciplina in analisador.disciplinas:
-                    media = analisador.calcular_media_aluno(aluno, disciplina)
-                    if media >= 6.0:
-                        aprovados += 1
-                    elif media >= 4.0:
-                        recuperacao += 1
-                    else:
-                        reprovados += 1
-
-            # Obter ranking dos melhores alunos (calcular manualmente)
-            ranking_alunos = []
-            for aluno in analisador.alunos:
-                medias = []
-                aprovacoes = 0
-                for disciplina in analisador.disciplinas:
-                    media = analisador.calcular_media_aluno(aluno, disciplina)
-                    if media > 0:
-                        medias.append(media)
-                        if media >= 6.0:
-                            aprovacoes += 1
-
-                if medias:
-                    media_geral = sum(medias) / len(medias)
-                    ranking_alunos.append({
-                        'nome': aluno,
-                        'media': media_geral,
-                        'aprovacoes': aprovacoes
-                    })
-
-            # Ordenar por média decrescente
-            ranking_alunos.sort(key=lambda x: x['media'], reverse=True)
-
-            # Top 5 melhores
-            ranking_melhores = "\n".join([
-                f"  {i+1}. {aluno['nome']}: média {aluno['media']:.2f} ({aluno['aprovacoes']} aprovações)"
-                for i, aluno in enumerate(ranking_alunos[:5])
-            ])
-
-            # Obter alunos que precisam de atenção
-            alunos_atencao = analisador.alunos_precisam_atencao(min_reprovacoes=2)
-            lista_atencao = "\n".join([
-                f"  - {aluno['nome']}: média {aluno['media_geral']:.2f} ({aluno['total_reprovacoes']} reprovações, prioridade {aluno['prioridade']})"
-                for aluno in alunos_atencao[:5]  # Limitar a 5
-            ])
-
-            # Obter desempenho por disciplina COM alunos com dificuldade
-            disciplinas_info = []
-            alunos_dificuldade_por_disc = analisador.identificar_alunos_dificuldade()
-
-            for disciplina in analisador.disciplinas:
-                nome_disc = disciplina.replace('Disciplina - ', '')
-                medias_disc = [analisador.calcular_media_aluno(aluno, disciplina) for aluno in analisador.alunos]
-                medias_validas = [m for m in medias_disc if m > 0]
-
-                if medias_validas:
-                    media_disc = sum(medias_validas) / len(medias_validas)
-
-                    # Obter alunos com dificuldade nesta disciplina
-                    alunos_dif = alunos_dificuldade_por_disc.get(disciplina, [])
-                    qtd_dif = len(alunos_dif)
-
-                    if qtd_dif > 0:
-                        # Mostrar apenas os 3 primeiros alunos para não sobrecarregar
-                        nomes_dif = ", ".join(alunos_dif[:3])
-                        if qtd_dif > 3:
-                            nomes_dif += f" e mais {qtd_dif - 3}"
-                        disciplinas_info.append(f"  - {nome_disc}: média {media_disc:.2f} ({qtd_dif} alunos com dificuldade: {nomes_dif})")
-                    else:
-                        disciplinas_info.append(f"  - {nome_disc}: média {media_disc:.2f} (sem alunos com dificuldade)")
-
-            disciplinas_texto = "\n".join(disciplinas_info[:10])  # Limitar a 10
-
-            # Obter evolução por trimestre (calcular média geral de cada trimestre)
-            desempenho_por_disc = analisador.desempenho_por_trimestre()
-
-            # Calcular média geral de cada trimestre
-            trim1_valores = []
-            trim2_valores = []
-            trim3_valores = []
-
-            for disciplina, trimestres in desempenho_por_disc.items():
-                if trimestres['1º Trimestre'] > 0:
-                    trim1_valores.append(trimestres['1º Trimestre'])
-                if trimestres['2º Trimestre'] > 0:
-                    trim2_valores.append(trimestres['2º Trimestre'])
-                if trimestres['3º Trimestre'] > 0:
-                    trim3_valores.append(trimestres['3º Trimestre'])
-
-            trim1 = sum(trim1_valores) / len(trim1_valores) if trim1_valores else 0.0
-            trim2 = sum(trim2_valores) / len(trim2_valores) if trim2_valores else 0.0
-            trim3 = sum(trim3_valores) / len(trim3_valores) if trim3_valores else 0.0
-
-            # Criar texto de evolução baseado nos dados disponíveis
-            if trim3 > 0:  # Tem todos os 3 trimestres
-                evolucao_texto = f"""  - 1º Trimestre: média {trim1:.2f}
-  - 2º Trimestre: média {trim2:.2f}
-  - 3º Trimestre: média {trim3:.2f}"""
-            elif trim2 > 0:  # Tem apenas 1º e 2º
-                evolucao_texto = f"""  - 1º Trimestre: média {trim1:.2f}
-  - 2º Trimestre: média {trim2:.2f}
-  - 3º Trimestre: não disponível (ainda não concluído)"""
-            else:  # Tem apenas 1º
-                evolucao_texto = f"""  - 1º Trimestre: média {trim1:.2f}
-  - 2º Trimestre: não disponível (ainda não concluído)
-  - 3º Trimestre: não disponível (ainda não concluído)"""
-
-            if trim3 > 0:  # Se tem 3º trimestre
-                if trim3 > trim2 > trim1:
-                    tendencia = "📈 Melhora constante ao longo do ano"
-                elif trim3 < trim2 < trim1:
-                    tendencia = "📉 Queda constante ao longo do ano"
-                elif trim3 > trim1:
-                    tendencia = "📈 Melhora geral (3º > 1º)"
-                elif trim3 < trim1:
-                    tendencia = "📉 Queda geral (3º < 1º)"
-                else:
-                    tendencia = "➡️ Desempenho estável"
-            elif trim2 > 0:  # Se tem apenas 1º e 2º trimestre
-                if trim2 > trim1:
-                    tendencia = "📈 Melhora do 1º para o 2º trimestre"
-                elif trim2 < trim1:
-                    tendencia = "📉 Queda do 1º para o 2º trimestre"
-                else:
-                    tendencia = "➡️ Desempenho estável"
-            else:
-                tendencia = "Apenas 1º trimestre disponível"
-
-            contexto_resumido = f"""
-DADOS DA TURMA ATUAL:
-- Total de alunos: {relatorio['total_alunos']}
-- Total de disciplinas: {relatorio['total_disciplinas']}
-- Média geral da turma: {relatorio['media_geral_turma']:.2f}
-- Aprovações: {aprovados}
-- Em recuperação: {recuperacao}
-- Reprovações: {reprovados}
-- Disciplina mais difícil: {relatorio['disciplina_mais_dificil'].replace('Disciplina - ', '')}
-- Disciplina mais fácil: {relatorio['disciplina_mais_facil'].replace('Disciplina - ', '')}
-
-EVOLUÇÃO AO LONGO DOS TRIMESTRES:
-{evolucao_texto}
-Tendência: {tendencia}
-
-TOP 5 MELHORES ALUNOS:
-{ranking_melhores}
-
-ALUNOS QUE PRECISAM DE ATENÇÃO:
-{lista_atencao if lista_atencao else "  Nenhum aluno com 2+ reprovações"}
-
-DESEMPENHO POR DISCIPLINA:
-{disciplinas_texto}
-"""
+            contexto_resumido = analisador.contexto_chatbot()
         else:
             contexto_resumido = "Dados da turma não disponíveis no momento."
 
         # Criar o prompt especializado para análise acadêmica
-        prompt = f"""Você é um assistente especializado em análise de dados acadêmicos do IFC.
-
-{contexto_resumido}
-
-INSTRUÇÕES:
-- Você TEM ACESSO COMPLETO aos dados acima, incluindo:
-  * Estatísticas gerais da turma
-  * Evolução por trimestre
-  * Ranking dos melhores alunos (com nomes)
-  * Alunos que precisam de atenção (com nomes)
-  * Desempenho por disciplina (com nomes dos alunos com dificuldade em cada disciplina)
-- As notas variam de 0 a 10
-- Média mínima para aprovação: 6.0
-- Recuperação: 4.0 a 5.9
-- Reprovação: abaixo de 4.0
-- Quando perguntarem sobre alunos com dificuldade em uma disciplina específica, USE os dados de "DESEMPENHO POR DISCIPLINA" que mostram os nomes dos alunos
-- Você pode analisar a evolução das notas ao longo dos trimestres
-- Seja CONCISO e DIRETO nas respostas (máximo 3 parágrafos curtos)
-- SEMPRE cite nomes específicos de alunos quando disponíveis nos dados
-- Se a pergunta for sobre um aluno específico que não está na lista, informe que precisa de mais detalhes
-
-PERGUNTA: {pergunta}
-
-RESPOSTA:"""
+        prompt = MODELO_PERGUNTA.format(contexto=contexto_resumido, pergunta=pergunta)
 
         # Gerar resposta com retry automático
         print(f"🔄 Chamando API Gemini para: {pergunta[:50]}...")
@@ -315,14 +156,11 @@ RESPOSTA:"""
 
         for attempt in range(max_retries):
             try:
-                response = model.generate_content(prompt)
+                response = model.generate_content(prompt, request_options={'timeout': TEMPO_LIMITE_GEMINI})
 
                 # Armazenar no cache
                 resposta_texto = response.text.strip()
-                gemini_cache[cache_key] = {
-                    'response': resposta_texto,
-                    'timestamp': time.time()
-                }
+                cache_respostas.guardar(cache_key, resposta_texto)
                 print(f"✅ Resposta armazenada em cache")
 
                 return resposta_texto
@@ -411,6 +249,7 @@ def logout():
     from flask_jwt_extended import unset_jwt_cookies
     response = jsonify({'message': 'Logout realizado com sucesso'})
     unset_jwt_cookies(response)
+    session.pop('turma_ativa', None)
     return response
 
 @app.route('/verify-token', methods=['GET'])
@@ -495,8 +334,39 @@ def manual():
 def pergunta():
     data = request.get_json()
     pergunta_usuario = data.get('pergunta')
-    resposta = fazer_pergunta_gemini(pergunta_usuario, contexto)
-    return jsonify({'resposta': resposta})
+    analisador = obter_analisador_ativo()
+
+    # Resposta já conhecida: devolve na hora, sem passar pela fila
+    cache_key = chave_pergunta(pergunta_usuario, analisador)
+    resposta = cache_respostas.obter(cache_key)
+    if resposta is not None:
+        print(f"✅ Resposta recuperada do cache para: {pergunta_usuario[:50]}...")
+        return jsonify({'resposta': resposta})
+
+    # Pergunta igual já em andamento (mesma chave do cache) não gera outra chamada ao Gemini
+    tarefa = fila_tarefas.enviar(fazer_pergunta_gemini, pergunta_usuario, analisador, chave=cache_key,
+                                 dono=get_jwt_identity())
+    if tarefa is None:
+        return jsonify({'erro': 'Muitas perguntas em andamento. Tente novamente em alguns segundos.'}), 503
+    return jsonify({'tarefa': tarefa, 'status': 'pendente'}), 202
+
+@app.route('/api/tarefas/<id_tarefa>')
+@jwt_required(optional=True)
+def api_tarefa(id_tarefa):
+    """Andamento de uma tarefa em segundo plano (pendente, executando, concluida ou erro)"""
+    tarefa = fila_tarefas.consultar(id_tarefa, dono=get_jwt_identity())
+    if tarefa is None:
+        return jsonify({'erro': 'Tarefa não encontrada'}), 404
+    return jsonify(tarefa)
+
+@app.route('/api/chatbot/cache')
+@jwt_required()
+def api_cache_respostas():
+    """Acertos, falhas e ocupação do cache de respostas do Gemini e da fila de tarefas"""
+    claims = get_jwt()
+    if claims.get('role') != 'coordenador':
+        return jsonify({'erro': 'Acesso negado'}), 403
+    return jsonify({**cache_respostas.estatisticas(), 'fila': fila_tarefas.estatisticas()})
 
 # APIs para os gráficos e dados
 @app.route('/api/relatorio-geral')
@@ -507,16 +377,18 @@ def api_relatorio_geral():
     # Somente coordenador pode ver estatísticas globais
     if claims.get('role') != 'coordenador':
         return jsonify({'erro': 'Acesso negado'}), 403
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
-    relatorio = analisador.relatorio_geral_turma()
+    relatorio = analisador.relatorio_completo()['relatorio_geral']
     return jsonify(relatorio)
 
 @app.route('/api/info-trimestre')
 @jwt_required()
 def api_info_trimestre():
     """API para informações sobre o trimestre atual da turma"""
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
@@ -530,6 +402,7 @@ def api_grafico_dificuldade():
     claims = get_jwt()
     if claims.get('role') != 'coordenador':
         return jsonify({'erro': 'Acesso negado'}), 403
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
@@ -573,11 +446,13 @@ def api_grafico_dificuldade():
 @app.route('/api/grafico-pizza-desempenho')
 def api_grafico_pizza_desempenho():
     """API para gráfico de pizza do desempenho geral"""
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
-    alunos_dificuldade = analisador.identificar_alunos_dificuldade()
-    alunos_destaque = analisador.alunos_destaque()
+    relatorio = analisador.relatorio_completo()
+    alunos_dificuldade = relatorio['alunos_dificuldade']
+    alunos_destaque = relatorio['alunos_destaque']
 
     total_avaliacoes = len(analisador.alunos) * len(analisador.disciplinas)
     com_dificuldade = sum(len(alunos) for alunos in alunos_dificuldade.values())
@@ -610,6 +485,7 @@ def api_grafico_pizza_desempenho():
 @jwt_required()
 def api_dados_trimestres():
     """API para dados das disciplinas por trimestre (para filtros)"""
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
@@ -647,6 +523,7 @@ def api_grafico_trimestres():
     claims = get_jwt()
     if claims.get('role') != 'coordenador':
         return jsonify({'erro': 'Acesso negado'}), 403
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
@@ -715,10 +592,11 @@ def api_grafico_trimestres():
 @jwt_required()
 def api_ranking_disciplinas():
     """API para ranking de disciplinas"""
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
-    ranking = analisador.ranking_disciplinas_dificeis()
+    ranking = analisador.relatorio_completo()['ranking_dificuldade']
 
     dados = []
     for i, (disciplina, percentual, total) in enumerate(ranking, 1):
@@ -736,6 +614,7 @@ def api_ranking_disciplinas():
 @app.route('/api/consulta-aluno')
 def api_consulta_aluno():
     """API para consulta de aluno específico"""
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
@@ -745,7 +624,7 @@ def api_consulta_aluno():
     if not nome_aluno:
         return jsonify({'erro': 'Nome do aluno não fornecido'})
 
-    if nome_aluno not in analisador.alunos:
+    if nome_aluno not in analisador.indice_alunos:
         return jsonify({'erro': 'Aluno não encontrado'})
 
     # Calcular dados do aluno
@@ -757,23 +636,11 @@ def api_consulta_aluno():
             if nome_simples.upper() != disciplina_filtro.upper():
                 continue
 
-        dados_disciplina = analisador.df[
-            (analisador.df['Nome'] == nome_aluno) &
-            (analisador.df['Disciplina'] == disciplina)
-        ].iloc[0]
-
         media = analisador.calcular_media_aluno(nome_aluno, disciplina)
         nome_disciplina = disciplina.split(' - ')[1] if ' - ' in disciplina else disciplina
 
-        # Validar notas antes de converter para float
-        nota_1t = dados_disciplina['Nota 1º trimestre']
-        nota_2t = dados_disciplina['Nota 2º trimestre']
-        nota_3t = dados_disciplina['Nota 3º trimestre']
-
-        # Converter para float ou None se for NaN/vazio
-        nota_1t = float(nota_1t) if pd.notna(nota_1t) and nota_1t != '' and nota_1t != 0 else None
-        nota_2t = float(nota_2t) if pd.notna(nota_2t) and nota_2t != '' and nota_2t != 0 else None
-        nota_3t = float(nota_3t) if pd.notna(nota_3t) and nota_3t != '' and nota_3t != 0 else None
+        # Consulta direta (O(1)) às notas do aluno na disciplina; None = sem nota
+        nota_1t, nota_2t, nota_3t = analisador.obter_notas(nome_aluno, disciplina) or [None, None, None]
 
         dados_aluno.append({
             'disciplina': nome_disciplina,
@@ -798,18 +665,49 @@ def api_consulta_aluno():
         'reprovado_em': len([d for d in dados_aluno if d['situacao'] == 'Reprovado'])
     }
 
-    # Gerar relatório IA (com cache para evitar chamadas repetidas)
-    try:
-        relatorio_gemini = gerar_relatorio_aluno_gemini(dados_resposta)
+    # Relatório IA: do cache, se já existir; senão é gerado em segundo plano e o cliente
+    # consulta a tarefa informada em relatorio_ia_tarefa
+    cache_key = chave_relatorio_aluno(dados_resposta, analisador.versao_dados)
+    relatorio_gemini = cache_respostas.obter(cache_key)
+    if relatorio_gemini is not None:
+        print(f"✅ Relatório recuperado do cache para: {nome_aluno}")
         dados_resposta['relatorio_ia'] = relatorio_gemini
-    except Exception as e:
-        print(f"Erro ao gerar relatório IA: {e}")
-        dados_resposta['relatorio_ia'] = f"Erro ao gerar relatório: {str(e)}"
+    else:
+        verify_jwt_in_request(optional=True)
+        tarefa = fila_tarefas.enviar(gerar_relatorio_aluno_gemini, dados_resposta, analisador.versao_dados,
+                                     chave=cache_key, dono=get_jwt_identity())
+        if tarefa is None:
+            dados_resposta['relatorio_ia'] = "Relatório indisponível no momento: muitas solicitações em andamento."
+        else:
+            dados_resposta['relatorio_ia_tarefa'] = tarefa
 
     return jsonify(dados_resposta)
 
-def gerar_relatorio_aluno_gemini(dados_aluno):
-    """Gera relatório do aluno usando Gemini com cache"""
+# Prompt do relatório pedagógico de um aluno
+MODELO_RELATORIO_ALUNO = """
+Gere um relatório pedagógico CONCISO e OBJETIVO para:
+
+ALUNO: {nome} | MÉDIA: {media_geral}
+SITUAÇÃO: {aprovado} aprovado, {recuperacao} recuperação, {reprovado} reprovado
+MELHOR: {melhor} ({media_melhor})
+PIOR: {pior} ({media_pior})
+
+EVOLUÇÃO: {evolucao}
+
+Gere um relatório de APENAS 2 parágrafos curtos:
+1. Análise geral + pontos fortes/fracos
+2. Recomendações práticas simples
+
+Seja direto, objetivo e construtivo. Máximo 150 palavras.
+"""
+
+def chave_relatorio_aluno(dados_aluno, versao_dados=None):
+    """Chave do cache: aluno e disciplinas consultadas (o filtro de disciplina muda o relatório)"""
+    consulta = f"{dados_aluno['nome']}|{'|'.join(disc['disciplina'] for disc in dados_aluno['disciplinas'])}"
+    return cache_respostas.chave(MODELO_RELATORIO_ALUNO, versao_dados, consulta)
+
+def gerar_relatorio_aluno_gemini(dados_aluno, versao_dados=None):
+    """Gera relatório do aluno usando Gemini e guarda no cache (executada pela fila de tarefas)"""
 
     nome = dados_aluno['nome']
     media_geral = dados_aluno['media_geral']
@@ -818,17 +716,7 @@ def gerar_relatorio_aluno_gemini(dados_aluno):
     reprovado = dados_aluno['reprovado_em']
     total = dados_aluno['total_disciplinas']
 
-    # Criar hash baseado nos dados do aluno para cache
-    cache_key = hashlib.md5(f"{nome}_{media_geral}_{aprovado}_{recuperacao}_{reprovado}".encode()).hexdigest()
-
-    # Verificar cache
-    if cache_key in gemini_cache:
-        cached_data = gemini_cache[cache_key]
-        if time.time() - cached_data['timestamp'] < CACHE_EXPIRATION:
-            print(f"✅ Relatório recuperado do cache para: {nome}")
-            return cached_data['response']
-        else:
-            del gemini_cache[cache_key]
+    cache_key = chave_relatorio_aluno(dados_aluno, versao_dados)
 
     # Encontrar melhor e pior disciplina
     disciplinas = dados_aluno['disciplinas']
@@ -865,36 +753,23 @@ def gerar_relatorio_aluno_gemini(dados_aluno):
         status_emoji = "✅" if disc['situacao'] == 'Aprovado' else "⚠️" if disc['situacao'] == 'Recuperação' else "❌"
         disciplinas_detalhes.append(f"{status_emoji} {disc['disciplina']}: {disc['media']} ({disc['situacao']})")
 
-    prompt = f"""
-Gere um relatório pedagógico CONCISO e OBJETIVO para:
-
-ALUNO: {nome} | MÉDIA: {media_geral}
-SITUAÇÃO: {aprovado} aprovado, {recuperacao} recuperação, {reprovado} reprovado
-MELHOR: {melhor_disciplina['disciplina']} ({melhor_disciplina['media']})
-PIOR: {pior_disciplina['disciplina']} ({pior_disciplina['media']})
-
-EVOLUÇÃO: {chr(10).join(evolucoes[:2]) if evolucoes else "Desempenho estável"}
-
-Gere um relatório de APENAS 2 parágrafos curtos:
-1. Análise geral + pontos fortes/fracos
-2. Recomendações práticas simples
-
-Seja direto, objetivo e construtivo. Máximo 150 palavras.
-"""
+    prompt = MODELO_RELATORIO_ALUNO.format(
+        nome=nome, media_geral=media_geral, aprovado=aprovado, recuperacao=recuperacao, reprovado=reprovado,
+        melhor=melhor_disciplina['disciplina'], media_melhor=melhor_disciplina['media'],
+        pior=pior_disciplina['disciplina'], media_pior=pior_disciplina['media'],
+        evolucao=chr(10).join(evolucoes[:2]) if evolucoes else "Desempenho estável"
+    )
 
     try:
         # Usar o modelo Gemini já configurado globalmente
         print(f"🔄 Gerando relatório IA para: {nome}")
         gemini_model = genai.GenerativeModel('gemini-2.5-flash-lite')
 
-        response = gemini_model.generate_content(prompt)
+        response = gemini_model.generate_content(prompt, request_options={'timeout': TEMPO_LIMITE_GEMINI})
         resposta_texto = response.text.strip()
 
         # Armazenar no cache
-        gemini_cache[cache_key] = {
-            'response': resposta_texto,
-            'timestamp': time.time()
-        }
+        cache_respostas.guardar(cache_key, resposta_texto)
         print(f"✅ Relatório armazenado em cache")
 
         return resposta_texto
@@ -904,6 +779,7 @@ Seja direto, objetivo e construtivo. Máximo 150 palavras.
 @app.route('/api/lista-alunos')
 def api_lista_alunos():
     """API para listar todos os alunos"""
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
@@ -913,6 +789,7 @@ def api_lista_alunos():
 @jwt_required()
 def api_consulta_disciplina():
     """API para consulta de disciplina com todos os alunos"""
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
@@ -928,6 +805,7 @@ def api_consulta_disciplina():
 @jwt_required()
 def api_resumo_disciplina():
     """Resumo estatístico de uma disciplina específica"""
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
@@ -943,35 +821,24 @@ def api_resumo_disciplina():
     recuperacao = 0
     reprovados = 0
 
-    for disciplina_completa in analisador.disciplinas:
+    for j, disciplina_completa in enumerate(analisador.disciplinas):
         nome_simples = disciplina_completa.split(' - ')[1] if ' - ' in disciplina_completa else disciplina_completa
         if nome_simples.upper() != nome_disciplina.upper():
             continue
 
         stats = analisador.calcular_media_disciplina(disciplina_completa)
         total_alunos += stats.get('total_alunos', 0)
-        media_disc = stats.get('media_geral_disciplina', 0)
+        media_disc = stats.get('media_geral', 0)
         if media_disc is not None:
             somatorio_medias += float(media_disc)
             contagem_medias += 1
 
-        # Classificar situação de cada aluno nesta disciplina
-        df_disc = analisador.df[analisador.df['Disciplina'] == disciplina_completa]
-        for _, row in df_disc.iterrows():
-            # Coletar apenas notas válidas
-            notas = []
-            for col in ['Nota 1º trimestre', 'Nota 2º trimestre', 'Nota 3º trimestre']:
-                if pd.notna(row[col]) and row[col] != '' and row[col] != 0:
-                    notas.append(float(row[col]))
-
-            if notas:  # Só calcular se houver notas válidas
-                m = sum(notas) / len(notas)
-                if m >= 6.0:
-                    aprovados += 1
-                elif m >= 4.0:
-                    recuperacao += 1
-                else:
-                    reprovados += 1
+        # Situação de cada aluno com nota nesta disciplina, pela matriz de situações (médias em float64,
+        # as mesmas de consulta_disciplina, mesmo com o DataFrame compacto em float32)
+        situacoes = analisador.situacoes[analisador.tem_notas[:, j], j]
+        aprovados += int(np.count_nonzero(situacoes == APROVADO))
+        recuperacao += int(np.count_nonzero(situacoes == RECUPERACAO))
+        reprovados += int(np.count_nonzero(situacoes == REPROVADO))
 
     media_geral = round(somatorio_medias / contagem_medias, 2) if contagem_medias > 0 else 0
     taxa_aprovacao = round((aprovados / (aprovados + recuperacao + reprovados)) * 100, 1) if (aprovados + recuperacao + reprovados) > 0 else 0
@@ -992,6 +859,7 @@ def api_resumo_disciplina():
 @jwt_required()
 def api_trimestres_disciplina():
     """Retorna evolução por trimestre de uma disciplina específica"""
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
@@ -1029,6 +897,7 @@ def api_trimestres_disciplina():
 @jwt_required()
 def api_lista_disciplinas():
     """API para listar disciplinas"""
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
@@ -1055,13 +924,15 @@ def api_listar_turmas():
     # Obter informações detalhadas de cada turma
     turmas_detalhadas = []
     for nome in nomes_turmas:
-        analisador_turma = gerenciador_turmas.obter_turma(nome)
-        if analisador_turma:
+        metadados = gerenciador_turmas.obter_metadados_turma(nome)
+        if metadados:
             turmas_detalhadas.append({
                 'nome': nome,
-                'total_alunos': len(analisador_turma.alunos),
-                'total_disciplinas': len(analisador_turma.disciplinas),
-                'curso': gerenciador_turmas.extrair_curso_da_turma(nome)
+                'total_alunos': metadados['total_alunos'],
+                'total_disciplinas': metadados['total_disciplinas'],
+                'curso': metadados['curso'],
+                'ano': metadados['ano'],
+                'atualizado_em': metadados['atualizado_em']
             })
 
     return jsonify(turmas_detalhadas)
@@ -1108,9 +979,62 @@ def api_ranking_disciplinas_geral():
 
     curso = request.args.get('curso')
     turmas = request.args.getlist('turma')
-    ranking = gerenciador_turmas.obter_ranking_disciplinas_geral(curso=curso, nomes_turmas=turmas if turmas else None)
+    # ponderar=true calcula a dificuldade sobre o total de alunos em vez da média dos percentuais das turmas
+    ponderar = request.args.get('ponderar', 'false').lower() == 'true'
+    ranking = gerenciador_turmas.obter_ranking_disciplinas_geral(curso=curso, nomes_turmas=turmas if turmas else None,
+                                                                 ponderar=ponderar)
     return jsonify(ranking)
 
+@app.route('/api/simulacao')
+@jwt_required()
+def api_simulacao():
+    """API para simular a classificação dos alunos com outros limites de nota.
+    Sem turma/curso simula a turma ativa; com todas=true, turma=... ou curso=... simula as turmas filtradas.
+    """
+    claims = get_jwt()
+
+    if claims.get('role') != 'coordenador':
+        return jsonify({'erro': 'Acesso negado'}), 403
+
+    try:
+        limite_aprovacao = float(request.args.get('limite_aprovacao', LIMITE_APROVACAO))
+        limite_recuperacao = float(request.args.get('limite_recuperacao', LIMITE_RECUPERACAO))
+        limite_destaque = float(request.args.get('limite_destaque', LIMITE_DESTAQUE))
+    except ValueError:
+        return jsonify({'erro': 'Limites devem ser numéricos'}), 400
+
+    if not all(math.isfinite(limite) for limite in (limite_aprovacao, limite_recuperacao, limite_destaque)):
+        return jsonify({'erro': 'Limites devem ser números finitos'}), 400
+
+    if limite_recuperacao > limite_aprovacao:
+        return jsonify({'erro': 'O limite de recuperação não pode ser maior que o de aprovação'}), 400
+
+    curso = request.args.get('curso')
+    turmas = request.args.getlist('turma')
+    todas = request.args.get('todas', 'false').lower() == 'true'
+
+    if todas or curso or turmas:
+        simulacao = gerenciador_turmas.simular_limites(limite_aprovacao, limite_recuperacao, limite_destaque,
+                                                       curso=curso, nomes_turmas=turmas if turmas else None)
+        return jsonify(simulacao)
+
+    analisador = obter_analisador_ativo()
+    if not analisador:
+        return jsonify({'erro': 'Analisador não disponível'})
+
+    return jsonify(analisador.simular_limites(limite_aprovacao, limite_recuperacao, limite_destaque))
+
+@app.route('/api/turmas/memoria')
+@jwt_required()
+def api_memoria_turmas():
+    """API com o relatório de memória das turmas carregadas"""
+    claims = get_jwt()
+
+    if claims.get('role') != 'coordenador':
+        return jsonify({'erro': 'Acesso negado'}), 403
+
+    return jsonify(gerenciador_turmas.relatorio_memoria())
+
 @app.route('/api/turmas/adicionar', methods=['POST'])
 @jwt_required()
 def api_adicionar_turma():
@@ -1175,24 +1099,24 @@ def api_atualizar_turma(nome_turma):
     if not arquivo.filename.endswith('.xlsx'):
         return jsonify({'erro': 'Apenas arquivos .xlsx são aceitos'}), 400
 
-    # Remover turma antiga e adicionar nova
-    gerenciador_turmas.remover_turma(nome_turma)
+    # A nova planilha só substitui a atual depois de lida com sucesso
     sucesso = gerenciador_turmas.adicionar_turma(nome_turma, arquivo)
 
     if sucesso:
+        # O registro já serve a nova versão para quem estiver com a turma ativa
         return jsonify({'sucesso': True, 'mensagem': f'Turma {nome_turma} atualizada com sucesso'})
     else:
-        return jsonify({'erro': 'Erro ao atualizar turma'}), 500
+        return jsonify({'erro': 'Erro ao atualizar turma; a versão anterior foi mantida'}), 500
 
 @app.route('/api/turmas/selecionar/<nome_turma>', methods=['POST'])
 @jwt_required()
 def api_selecionar_turma(nome_turma):
     """API para selecionar turma ativa na dashboard"""
-    global analisador
-
     analisador = obter_analisador_turma(nome_turma)
 
     if analisador:
+        # A turma ativa é guardada na sessão do usuário, não no processo
+        session['turma_ativa'] = gerenciador_turmas.normalizar_nome_turma(nome_turma)
         return jsonify({
             'sucesso': True,
             'mensagem': f'Turma {nome_turma} selecionada',
@@ -1364,12 +1288,12 @@ def api_disciplinas_por_curso():
     mapa: dict = {}
     cursos_detectados: set = set()
 
-    # Percorre todas as turmas carregadas
-    for nome_turma, anal in getattr(gerenciador_turmas, 'turmas', {}).items():
+    # Percorre as disciplinas de todas as turmas (pelo cubo, sem recarregar planilhas a cada requisição)
+    for nome_turma, disciplinas in gerenciador_turmas.disciplinas_por_turma().items():
         try:
-            curso_turma = norm_curso(gerenciador_turmas.extrair_curso_da_turma(nome_turma))
+            curso_turma = norm_curso(gerenciador_turmas.curso_da_turma(nome_turma))
             cursos_detectados.add(curso_turma)
-            for disciplina_completa in getattr(anal, 'disciplinas', []):
+            for disciplina_completa in disciplinas:
                 if ' - ' in disciplina_completa:
                     curso_prefixo, nome_disc = disciplina_completa.split(' - ', 1)
                     curso = norm_curso(curso_prefixo)
@@ -1387,6 +1311,7 @@ def api_disciplinas_por_curso():
         mapa.setdefault(c, set())
 
     # Fallback: se não houver turmas carregadas, tentar deduzir a partir do analisador principal
+    analisador = obter_analisador_ativo()
     if not any(len(v) for v in mapa.values()) and analisador:
         for disciplina_completa in analisador.disciplinas:
             if ' - ' in disciplina_completa:
@@ -1418,6 +1343,7 @@ def api_disciplinas_por_curso():
 @jwt_required()
 def api_alunos_atencao():
     """API para alunos que precisam de atenção especial"""
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
@@ -1433,18 +1359,13 @@ def api_alunos_atencao():
             return jsonify({'erro': 'Acesso negado a esta disciplina'}), 403
 
         # Construir lista de alunos com base apenas na disciplina informada
-        df = analisador.df.copy()
-        # Normalizar nomes
-        def nome_simples(d):
-            return d.split(' - ')[1] if ' - ' in d else d
-        df = df[df['Disciplina'].apply(lambda d: nome_simples(d).upper() == disciplina.upper())]
+        j = analisador.indice_nomes_disciplinas.get(disciplina.upper())
+        alunos_disciplina = analisador.alunos[analisador.matriculado[:, j]].tolist() if j is not None else []
 
         alunos_resposta = []
-        for aluno in sorted(df['Nome'].unique().tolist()):
-            registros = df[df['Nome'] == aluno]
+        for aluno in sorted(alunos_disciplina):
             # Média da disciplina
-            media = float((registros['Nota 1º trimestre'].astype(float) + registros['Nota 2º trimestre'].astype(float) + registros['Nota 3º trimestre'].astype(float)) / 3.0)
-            media = round(media, 2)
+            media = round(float(analisador.calcular_media_aluno(aluno, analisador.disciplinas[j])), 2)
             # Situação
             if media >= 6.0:
                 situacao = 'Aprovado'
@@ -1492,14 +1413,23 @@ def api_alunos_atencao():
 @app.route('/api/ranking-melhores-alunos')
 @jwt_required()
 def api_ranking_melhores_alunos():
-    """API para ranking dos melhores alunos"""
+    """API para ranking dos melhores alunos (ou dos piores, com ordem=asc)"""
+    analisador = obter_analisador_ativo()
     if not analisador:
         return jsonify({'erro': 'Analisador não disponível'})
 
-    # Parâmetro opcional para limitar quantidade
+    # Parâmetros opcionais de paginação e ordenação
     limite = int(request.args.get('limite', 10))
+    deslocamento = int(request.args.get('deslocamento', 0))
+    ordem = request.args.get('ordem', 'desc')
+    criterio = request.args.get('criterio', 'media_geral')
     disciplina = request.args.get('disciplina')
 
+    if ordem not in ('asc', 'desc'):
+        return jsonify({'erro': 'Ordem inválida. Use asc ou desc'}), 400
+    if criterio not in CRITERIOS_RANKING:
+        return jsonify({'erro': f"Critério inválido. Use um de: {', '.join(CRITERIOS_RANKING)}"}), 400
+
     # Ranking por disciplina (professor)
     if disciplina:
         current_user = get_jwt_identity()
@@ -1507,20 +1437,17 @@ def api_ranking_melhores_alunos():
             return jsonify({'erro': 'Acesso negado a esta disciplina'}), 403
 
         # Calcular média da disciplina por aluno
-        df = analisador.df.copy()
-        def nome_simples(d):
-            return d.split(' - ')[1] if ' - ' in d else d
-        df = df[df['Disciplina'].apply(lambda d: nome_simples(d).upper() == disciplina.upper())]
+        j = analisador.indice_nomes_disciplinas.get(disciplina.upper())
+        alunos_disciplina = analisador.alunos[analisador.matriculado[:, j]].tolist() if j is not None else []
 
         alunos = []
-        for aluno in df['Nome'].unique().tolist():
-            reg = df[df['Nome'] == aluno]
-            media = float((reg['Nota 1º trimestre'].astype(float) + reg['Nota 2º trimestre'].astype(float) + reg['Nota 3º trimestre'].astype(float)) / 3.0)
+        for aluno in alunos_disciplina:
+            media = float(analisador.calcular_media_aluno(aluno, analisador.disciplinas[j]))
             alunos.append((aluno, round(media, 2)))
 
-        alunos.sort(key=lambda x: x[1], reverse=True)
+        alunos.sort(key=lambda x: x[1], reverse=(ordem == 'desc'))
         ranking = []
-        for i, (nome, media) in enumerate(alunos[:limite], 1):
+        for i, (nome, media) in enumerate(alunos[deslocamento:deslocamento + limite], deslocamento + 1):
             ranking.append({
                 'posicao': i,
                 'nome': nome,
@@ -1538,16 +1465,23 @@ def api_ranking_melhores_alunos():
         return jsonify({
             'ranking': ranking,
             'total': len(ranking),
+            'total_alunos': len(alunos),
             'limite': limite,
+            'deslocamento': deslocamento,
+            'ordem': ordem,
             'disciplina': disciplina
         })
 
     # Global (coordenador)
-    ranking = analisador.ranking_melhores_alunos(limite)
+    ranking = analisador.ranking_melhores_alunos(limite, deslocamento, ordem, criterio)
     return jsonify({
         'ranking': ranking,
         'total': len(ranking),
-        'limite': limite
+        'total_alunos': len(analisador.alunos),
+        'limite': limite,
+        'deslocamento': deslocamento,
+        'ordem': ordem,
+        'criterio': criterio
     })
 
 if __name__ == '__main__':
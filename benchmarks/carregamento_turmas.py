@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark da carga de turmas: sequencial x paralela (multiprocessing.Pool)
+
+Replica as planilhas de exemplo de turmas/ até ~200 turmas num diretório
+temporário e mede a carga completa a frio (sem cache colunar) nos dois modos.
+O ganho depende dos núcleos disponíveis: com um só núcleo não há speedup.
+
+Uso: python benchmarks/carregamento_turmas.py [--turmas 200] [--processos N]
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from gerenciador_turmas import GerenciadorTurmas
+
+
+def preparar_diretorio(destino: str, total_turmas: int):
+    """Copia as planilhas de exemplo para destino até somar total_turmas arquivos"""
+    exemplos = sorted(glob.glob(os.path.join(RAIZ, 'turmas', '*.xlsx')))
+    for i in range(total_turmas):
+        origem = exemplos[i % len(exemplos)]
+        nome = os.path.splitext(os.path.basename(origem))[0]
+        shutil.copy(origem, os.path.join(destino, f"{nome}_{i:03d}.xlsx"))
+
+
+def medir(total_turmas: int, processos: int) -> float:
+    """Tempo (s) para carregar todas as turmas de um diretório novo"""
+    with tempfile.TemporaryDirectory() as diretorio:
+        preparar_diretorio(diretorio, total_turmas)
+        gerenciador = GerenciadorTurmas(diretorio, max_turmas_carregadas=total_turmas)
+
+        try:
+            inicio = time.perf_counter()
+            carregadas = gerenciador.carregar_em_paralelo(processos=processos)
+            duracao = time.perf_counter() - inicio
+        finally:
+            gerenciador.encerrar()
+
+        assert len(carregadas) == total_turmas
+        return duracao
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turmas', type=int, default=200)
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    sequencial = medir(args.turmas, 1)
+    paralelo = medir(args.turmas, args.processos)
+
+    print(f"Turmas: {args.turmas} | Processos: {args.processos} | Núcleos: {os.cpu_count()}")
+    print(f"Sequencial: {sequencial:.2f}s")
+    print(f"Paralelo:   {paralelo:.2f}s")
+    print(f"Speedup:    {sequencial / paralelo:.2f}x")
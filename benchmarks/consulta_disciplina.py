@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark de AnalisadorAcademico.consulta_disciplina
+
+Gera uma turma sintética (padrão: 1.000 alunos × 10 disciplinas), mede a
+consulta de uma disciplina sem resultados memorizados e compara a mediana
+com o limite de 1 ms.
+
+Uso: python benchmarks/consulta_disciplina.py [--alunos 1000] [--repeticoes 200]
+"""
+
+import argparse
+import gc
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from analises_academicas import AnalisadorAcademico, COLUNAS_NOTAS
+
+DISCIPLINAS = ['MATEMÁTICA', 'PORTUGUÊS', 'INGLÊS', 'FÍSICA', 'QUÍMICA',
+               'BIOLOGIA', 'HISTÓRIA', 'GEOGRAFIA', 'FILOSOFIA', 'SOCIOLOGIA']
+LIMITE_MS = 1.0
+
+
+def gerar_planilha(caminho: str, total_alunos: int):
+    """Grava uma planilha no formato das turmas com notas aleatórias"""
+    rng = np.random.default_rng(42)
+    linhas = total_alunos * len(DISCIPLINAS)
+    df = pd.DataFrame({
+        'Nome': np.repeat([f"ALUNO_{i:04d}" for i in range(1, total_alunos + 1)], len(DISCIPLINAS)),
+        'Disciplina': np.tile([f"Disciplina - {d}" for d in DISCIPLINAS], total_alunos),
+    })
+    for col in COLUNAS_NOTAS:
+        df[col] = np.round(rng.uniform(2, 10, linhas), 1)
+    df.to_excel(caminho, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alunos', type=int, default=1000)
+    parser.add_argument('--repeticoes', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'turma_sintetica.xlsx')
+        gerar_planilha(caminho, args.alunos)
+        analisador = AnalisadorAcademico(caminho)
+
+    # Como no timeit, o coletor de lixo fica desligado durante as medições
+    tempos = []
+    resultado = None
+    gc.disable()
+    for _ in range(args.repeticoes):
+        analisador.limpar_cache()
+        resultado = None
+        inicio = time.perf_counter()
+        resultado = analisador.consulta_disciplina('MATEMÁTICA')
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    gc.enable()
+
+    assert resultado['total_alunos'] == args.alunos
+    mediana = statistics.median(tempos)
+
+    print(f"Alunos: {args.alunos} | Repetições: {args.repeticoes}")
+    print(f"consulta_disciplina: mediana {mediana:.3f} ms | mínimo {min(tempos):.3f} ms")
+    if mediana >= LIMITE_MS:
+        print(f"Acima do limite de {LIMITE_MS} ms")
+        sys.exit(1)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Cache de Respostas do Gemini
+Desenvolvido para TCC - Sistema de Análise de Notas Acadêmicas
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+# Padrões (podem ser alterados pelas variáveis de ambiente lidas em app.py)
+MAX_RESPOSTAS = 512
+VALIDADE_RESPOSTAS = 3600  # 1 hora em segundos
+
+
+def normalizar_pergunta(pergunta: str) -> str:
+    """Normaliza a pergunta para o cache: sem diferença de caixa, espaços ou pontuação final"""
+    return ' '.join(str(pergunta).casefold().split()).rstrip(' ?!.')
+
+
+class CacheRespostas:
+    """Cache limitado de respostas do modelo, separado por turma.
+
+    A chave combina o modelo de prompt, a versão dos dados da turma (hash da
+    planilha) e a pergunta normalizada; a mesma pergunta sobre outra turma, ou
+    sobre a mesma turma depois de a planilha mudar, não reaproveita a resposta.
+    As entradas expiram após `validade` segundos e, acima de `max_respostas`,
+    as menos usadas são descartadas. Com `caminho_sqlite` as respostas ficam em
+    disco, sobrevivem a reinícios e são compartilhadas entre processos.
+    """
+
+    def __init__(self, max_respostas: int = MAX_RESPOSTAS, validade: float = VALIDADE_RESPOSTAS,
+                 caminho_sqlite: Optional[str] = None):
+        self.max_respostas = max(int(max_respostas), 1)
+        self.validade = validade
+        self.caminho_sqlite = caminho_sqlite
+        self.acertos = 0
+        self.falhas = 0
+        self._respostas = OrderedDict()
+        self._lock = threading.Lock()
+        if caminho_sqlite:
+            self._criar_tabela()
+
+    @staticmethod
+    def chave(modelo_prompt: str, versao_dados: Optional[str], pergunta: str) -> str:
+        """Chave do cache para (modelo de prompt, versão dos dados, pergunta normalizada)"""
+        partes = (hashlib.sha256(modelo_prompt.encode()).hexdigest(), versao_dados or '',
+                  normalizar_pergunta(pergunta))
+        return hashlib.sha256('\x1f'.join(partes).encode()).hexdigest()
+
+    def obter(self, chave: str) -> Optional[str]:
+        """Retorna a resposta guardada (ou None se ausente ou expirada)"""
+        if self.caminho_sqlite:
+            resposta = self._obter_sqlite(chave)
+        else:
+            resposta = self._obter_memoria(chave)
+
+        with self._lock:
+            if resposta is None:
+                self.falhas += 1
+            else:
+                self.acertos += 1
+        return resposta
+
+    def guardar(self, chave: str, resposta: str):
+        """Guarda uma resposta, descartando as expiradas e as menos usadas acima do limite"""
+        if self.caminho_sqlite:
+            self._guardar_sqlite(chave, resposta)
+        else:
+            self._guardar_memoria(chave, resposta)
+
+    def limpar(self):
+        """Descarta todas as respostas guardadas"""
+        with self._lock:
+            self._respostas.clear()
+        if self.caminho_sqlite:
+            with self._conectar() as conexao:
+                conexao.execute('DELETE FROM respostas')
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Contadores de acertos/falhas deste processo e ocupação do cache"""
+        with self._lock:
+            acertos, falhas = self.acertos, self.falhas
+        consultas = acertos + falhas
+        return {
+            'armazenamento': 'sqlite' if self.caminho_sqlite else 'memoria',
+            'respostas': len(self),
+            'max_respostas': self.max_respostas,
+            'validade_segundos': self.validade,
+            'acertos': acertos,
+            'falhas': falhas,
+            'taxa_acerto': round(acertos / consultas * 100, 1) if consultas else 0.0
+        }
+
+    def __len__(self) -> int:
+        if self.caminho_sqlite:
+            with self._conectar() as conexao:
+                return conexao.execute('SELECT COUNT(*) FROM respostas').fetchone()[0]
+        with self._lock:
+            return len(self._respostas)
+
+    # ---- armazenamento em memória ----
+
+    def _obter_memoria(self, chave: str) -> Optional[str]:
+        with self._lock:
+            entrada = self._respostas.get(chave)
+            if entrada is None:
+                return None
+            resposta, criado_em = entrada
+            if time.time() - criado_em >= self.validade:
+                del self._respostas[chave]
+                return None
+            self._respostas.move_to_end(chave)
+            return resposta
+
+    def _guardar_memoria(self, chave: str, resposta: str):
+        agora = time.time()
+        with self._lock:
+            self._respostas[chave] = (resposta, agora)
+            self._respostas.move_to_end(chave)
+            # Expiradas primeiro; depois as menos usadas
+            expiradas = [c for c, (_, criado_em) in self._respostas.items() if agora - criado_em >= self.validade]
+            for c in expiradas:
+                del self._respostas[c]
+            while len(self._respostas) > self.max_respostas:
+                self._respostas.popitem(last=False)
+
+    # ---- armazenamento em SQLite ----
+
+    @contextmanager
+    def _conectar(self):
+        """Uma conexão por operação (segura entre threads e entre processos); confirma e fecha ao sair"""
+        conexao = sqlite3.connect(self.caminho_sqlite, timeout=10)
+        try:
+            with conexao:
+                yield conexao
+        finally:
+            conexao.close()
+
+    def _criar_tabela(self):
+        diretorio = os.path.dirname(os.path.abspath(self.caminho_sqlite))
+        os.makedirs(diretorio, exist_ok=True)
+        with self._conectar() as conexao:
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('''CREATE TABLE IF NOT EXISTS respostas (
+                                   chave TEXT PRIMARY KEY,
+                                   resposta TEXT NOT NULL,
+                                   criado_em REAL NOT NULL,
+                                   usado_em REAL NOT NULL)''')
+            conexao.execute('CREATE INDEX IF NOT EXISTS respostas_usado_em ON respostas (usado_em)')
+
+    def _obter_sqlite(self, chave: str) -> Optional[str]:
+        agora = time.time()
+        try:
+            with self._conectar() as conexao:
+                linha = conexao.execute('SELECT resposta FROM respostas WHERE chave = ? AND criado_em > ?',
+                                        (chave, agora - self.validade)).fetchone()
+                if linha is None:
+                    return None
+                conexao.execute('UPDATE respostas SET usado_em = ? WHERE chave = ?', (agora, chave))
+                return linha[0]
+        except sqlite3.Error as e:
+            print(f"Erro ao ler cache de respostas: {e}")
+            return None
+
+    def _guardar_sqlite(self, chave: str, resposta: str):
+        agora = time.time()
+        try:
+            with self._conectar() as conexao:
+                conexao.execute('INSERT OR REPLACE INTO respostas (chave, resposta, criado_em, usado_em) '
+                                'VALUES (?, ?, ?, ?)', (chave, resposta, agora, agora))
+                conexao.execute('DELETE FROM respostas WHERE criado_em <= ?', (agora - self.validade,))
+                conexao.execute('DELETE FROM respostas WHERE chave NOT IN '
+                                '(SELECT chave FROM respostas ORDER BY usado_em DESC LIMIT ?)',
+                                (self.max_respostas,))
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar cache de respostas: {e}")
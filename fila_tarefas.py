@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Fila de Tarefas em Segundo Plano (chamadas ao Gemini)
+Desenvolvido para TCC - Sistema de Análise de Notas Acadêmicas
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Padrões (podem ser alterados pelas variáveis de ambiente lidas em app.py)
+MAX_TRABALHADORES = 2
+MAX_PENDENTES = 32
+VALIDADE_RESULTADOS = 600  # segundos que um resultado fica disponível para consulta
+TEMPO_MAXIMO_TAREFA = 300  # execução não concluída depois disso (desde o envio) é dada como erro
+
+EM_ANDAMENTO = ('pendente', 'executando')
+
+
+class FilaTarefas:
+    """Executa tarefas lentas fora da requisição, num número limitado de threads.
+
+    enviar() devolve na hora o identificador da tarefa e o cliente consulta o
+    andamento com consultar(). Tarefas com a mesma chave (ex.: a chave do cache
+    de respostas) já em andamento não são executadas de novo: o novo pedido
+    recebe um id próprio que acompanha a execução existente. Acima de
+    max_pendentes execuções não concluídas neste processo a fila recusa novas
+    tarefas. Execução que passa de tempo_maximo segundos desde o envio é dada
+    como erro (e deixa de ser reaproveitada). O estado das tarefas fica numa
+    tabela SQLite: em memória, ou no arquivo caminho_sqlite, compartilhado entre
+    processos (trabalhadores WSGI), de modo que a consulta pode cair em qualquer
+    processo. As threads são daemon: uma chamada presa não impede o processo de
+    encerrar.
+    """
+
+    def __init__(self, max_trabalhadores: int = MAX_TRABALHADORES, max_pendentes: int = MAX_PENDENTES,
+                 validade_resultados: float = VALIDADE_RESULTADOS, caminho_sqlite: Optional[str] = None,
+                 tempo_maximo: float = TEMPO_MAXIMO_TAREFA):
+        self.max_pendentes = max(int(max_pendentes), 1)
+        self.validade_resultados = validade_resultados
+        self.tempo_maximo = tempo_maximo
+        self.caminho_sqlite = caminho_sqlite
+        self.execucoes = 0
+        self._lock = threading.Lock()
+        self._memoria = None if caminho_sqlite else sqlite3.connect(':memory:', check_same_thread=False)
+        self._lock_memoria = threading.Lock()
+        self._criar_tabela()
+
+        self._encerrada = False
+        self._fila = queue.Queue()
+        self._trabalhadores = [
+            threading.Thread(target=self._trabalhar, name=f'tarefas-ia-{n}', daemon=True)
+            for n in range(max(int(max_trabalhadores), 1))
+        ]
+        for trabalhador in self._trabalhadores:
+            trabalhador.start()
+
+    def enviar(self, funcao: Callable, *args, chave: str, dono: Optional[str] = None, **kwargs) -> Optional[str]:
+        """Agenda funcao(*args, **kwargs) e retorna o id da tarefa (ou None se a fila estiver cheia)"""
+        agora = time.time()
+        id_tarefa = uuid.uuid4().hex
+        with self._lock:
+            self._descartar_expiradas(agora)
+            em_andamento = self._execucao_em_andamento(chave, agora)
+            if em_andamento is None and (self._encerrada or self.execucoes >= self.max_pendentes):
+                return None
+
+            # Mesma chave já em execução: a nova tarefa só acompanha o resultado dela
+            execucao, status, expira_em = em_andamento or (id_tarefa, 'pendente', agora + self.tempo_maximo)
+            with self._conectar() as conexao:
+                conexao.execute('INSERT INTO tarefas (id, execucao, chave, dono, status, criado_em, expira_em) '
+                                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                (id_tarefa, execucao, chave, dono, status, agora, expira_em))
+            if em_andamento is not None:
+                return id_tarefa
+            self.execucoes += 1
+
+        self._fila.put((execucao, funcao, args, kwargs))
+        return id_tarefa
+
+    def consultar(self, id_tarefa: str, dono: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Retorna o estado da tarefa (None se não existir ou pertencer a outro usuário)"""
+        self._encerrar_atrasadas(time.time())
+        with self._conectar() as conexao:
+            linha = conexao.execute('SELECT id, dono, status, resultado, erro, criado_em, concluido_em '
+                                    'FROM tarefas WHERE id = ?', (id_tarefa,)).fetchone()
+        if linha is None or linha[1] != dono:
+            return None
+
+        tarefa = dict(zip(('id', 'dono', 'status', 'resultado', 'erro', 'criado_em', 'concluido_em'), linha))
+        del tarefa['dono']
+        return tarefa
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Ocupação da fila deste processo e quantidade de tarefas por status"""
+        with self._conectar() as conexao:
+            por_status = dict(conexao.execute('SELECT status, COUNT(*) FROM tarefas GROUP BY status').fetchall())
+        with self._lock:
+            execucoes = self.execucoes
+        return {
+            'armazenamento': 'sqlite' if self.caminho_sqlite else 'memoria',
+            'max_pendentes': self.max_pendentes,
+            'execucoes_em_andamento': execucoes,
+            'por_status': por_status
+        }
+
+    def encerrar(self, aguardar: bool = False):
+        """Encerra as threads; tarefas ainda não iniciadas são canceladas"""
+        with self._lock:
+            if self._encerrada:
+                return
+            self._encerrada = True
+
+        while True:
+            try:
+                execucao = self._fila.get_nowait()[0]
+            except queue.Empty:
+                break
+            self._atualizar(execucao, status='erro', erro='Tarefa cancelada. Tente novamente.',
+                            concluido_em=time.time())
+            with self._lock:
+                self.execucoes -= 1
+
+        for _ in self._trabalhadores:
+            self._fila.put(None)
+        if aguardar:
+            for trabalhador in self._trabalhadores:
+                trabalhador.join()
+
+    def _trabalhar(self):
+        while True:
+            item = self._fila.get()
+            if item is None:
+                return
+            self._executar(*item)
+
+    def _executar(self, execucao: str, funcao: Callable, args: tuple, kwargs: Dict[str, Any]):
+        self._atualizar(execucao, status='executando')
+        try:
+            resultado = funcao(*args, **kwargs)
+        except Exception as e:
+            print(f"Erro na tarefa {execucao[:12]}: {e}")
+            self._atualizar(execucao, status='erro', erro=str(e), concluido_em=time.time())
+        else:
+            self._atualizar(execucao, status='concluida', resultado=resultado, concluido_em=time.time())
+        finally:
+            with self._lock:
+                self.execucoes -= 1
+
+    # ---- armazenamento ----
+
+    @contextmanager
+    def _conectar(self):
+        """Conexão com a tabela de tarefas; confirma ao sair.
+
+        Em memória há uma única conexão, usada sob lock; com arquivo, uma conexão por
+        operação (segura entre threads e entre processos).
+        """
+        if self._memoria is not None:
+            with self._lock_memoria:
+                with self._memoria:
+                    yield self._memoria
+            return
+
+        conexao = sqlite3.connect(self.caminho_sqlite, timeout=10)
+        try:
+            with conexao:
+                yield conexao
+        finally:
+            conexao.close()
+
+    def _criar_tabela(self):
+        if self.caminho_sqlite:
+            os.makedirs(os.path.dirname(os.path.abspath(self.caminho_sqlite)), exist_ok=True)
+        with self._conectar() as conexao:
+            if self.caminho_sqlite:
+                conexao.execute('PRAGMA journal_mode=WAL')
+            # Tabela de uma versão anterior (sem execucao/expira_em): as tarefas são passageiras, recria
+            colunas = [linha[1] for linha in conexao.execute('PRAGMA table_info(tarefas)')]
+            if colunas and 'expira_em' not in colunas:
+                conexao.execute('DROP TABLE tarefas')
+            conexao.execute('''CREATE TABLE IF NOT EXISTS tarefas (
+                                   id TEXT PRIMARY KEY,
+                                   execucao TEXT NOT NULL,
+                                   chave TEXT NOT NULL,
+                                   dono TEXT,
+                                   status TEXT NOT NULL,
+                                   resultado TEXT,
+                                   erro TEXT,
+                                   criado_em REAL NOT NULL,
+                                   expira_em REAL NOT NULL,
+                                   concluido_em REAL)''')
+            conexao.execute('CREATE INDEX IF NOT EXISTS tarefas_chave ON tarefas (chave, status)')
+            conexao.execute('CREATE INDEX IF NOT EXISTS tarefas_execucao ON tarefas (execucao)')
+
+    def _execucao_em_andamento(self, chave: str, agora: float) -> Optional[Tuple[str, str, float]]:
+        """(execução, status, expira_em) de uma execução ainda no prazo com esta chave (em qualquer processo)"""
+        with self._conectar() as conexao:
+            return conexao.execute('SELECT execucao, status, expira_em FROM tarefas WHERE chave = ? '
+                                   'AND status IN (?, ?) AND expira_em > ? ORDER BY criado_em DESC LIMIT 1',
+                                   (chave, *EM_ANDAMENTO, agora)).fetchone()
+
+    def _atualizar(self, execucao: str, **campos):
+        """Atualiza todas as tarefas em andamento que acompanham esta execução"""
+        colunas = ', '.join(f'{coluna} = ?' for coluna in campos)
+        with self._conectar() as conexao:
+            conexao.execute(f'UPDATE tarefas SET {colunas} WHERE execucao = ? AND status IN (?, ?)',
+                            (*campos.values(), execucao, *EM_ANDAMENTO))
+
+    def _encerrar_atrasadas(self, agora: float):
+        """Dá como erro as tarefas cuja execução passou do tempo máximo (presa ou de um processo encerrado)"""
+        with self._conectar() as conexao:
+            conexao.execute('UPDATE tarefas SET status = ?, erro = ?, concluido_em = ? '
+                            'WHERE status IN (?, ?) AND expira_em <= ?',
+                            ('erro', 'Tempo limite da tarefa excedido. Tente novamente.', agora,
+                             *EM_ANDAMENTO, agora))
+
+    def _descartar_expiradas(self, agora: float):
+        self._encerrar_atrasadas(agora)
+        with self._conectar() as conexao:
+            conexao.execute('DELETE FROM tarefas WHERE concluido_em IS NOT NULL AND concluido_em <= ?',
+                            (agora - self.validade_resultados,))
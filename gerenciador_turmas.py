@@ -1,16 +1,446 @@
+import io
 import os
+import re
+import json
+import threading
+import time
+import queue
+import multiprocessing
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import datetime
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Any, Optional
-from analises_academicas import AnalisadorAcademico
+from typing import Dict, List, Tuple, Any, Optional
+from analises_academicas import (AnalisadorAcademico, DIRETORIO_CACHE_PLANILHAS, COLUNAS_NOTAS, SITUACOES,
+                                 APROVADO, RECUPERACAO, REPROVADO, LIMITE_APROVACAO, LIMITE_RECUPERACAO, LIMITE_DESTAQUE,
+                                 classificar_trimestre, diferenca_resumos, resumir_situacoes, situacao_geral_alunos)
+
+# Quantidade padrão de analisadores mantidos em memória ao mesmo tempo
+MAX_TURMAS_CARREGADAS = 16
+
+# Versão do formato do manifesto de turmas (manifestos de outra versão são refeitos)
+VERSAO_MANIFESTO = 2
+
+class RegistroTurmas(MutableMapping):
+    """Registro de turmas com carregamento sob demanda.
+
+    Conhece todas as turmas (nome -> arquivo), mas só constrói o
+    AnalisadorAcademico no primeiro acesso. Os analisadores carregados ficam
+    numa fila LRU limitada a max_carregadas; os menos usados são descartados
+    e recarregados (pelo cache colunar) quando voltarem a ser acessados.
+    """
+
+    def __init__(self, max_carregadas: int = MAX_TURMAS_CARREGADAS, compacto: bool = True):
+        self.max_carregadas = max_carregadas
+        self.compacto = compacto
+        self.arquivos = {}
+        self.carregadas = OrderedDict()
+        self._lock = threading.RLock()
+        # Turma -> lock da carga em andamento (quem pede a mesma turma espera a mesma carga)
+        self._carregando = {}
+
+    def registrar(self, nome_turma: str, caminho_arquivo: str):
+        """Registra uma turma sem carregá-la"""
+        with self._lock:
+            self.arquivos[nome_turma] = caminho_arquivo
+            self.carregadas.pop(nome_turma, None)
+
+    def remover(self, nome_turma: str) -> Optional[AnalisadorAcademico]:
+        """Remove a turma do registro e retorna o analisador, se estava carregado"""
+        with self._lock:
+            self.arquivos.pop(nome_turma, None)
+            return self.carregadas.pop(nome_turma, None)
+
+    def esta_carregada(self, nome_turma: str) -> bool:
+        return nome_turma in self.carregadas
+
+    def obter_carregada(self, nome_turma: str) -> Optional[AnalisadorAcademico]:
+        """Analisador da turma se já estiver carregado (nunca carrega)"""
+        with self._lock:
+            return self.carregadas.get(nome_turma)
+
+    def carregadas_agora(self) -> List[Tuple[str, AnalisadorAcademico]]:
+        """Cópia dos pares (nome, analisador) carregados neste momento"""
+        with self._lock:
+            return list(self.carregadas.items())
+
+    def _guardar(self, nome_turma: str, analisador: AnalisadorAcademico):
+        self.carregadas[nome_turma] = analisador
+        self.carregadas.move_to_end(nome_turma)
+        while len(self.carregadas) > max(self.max_carregadas, 1):
+            self.carregadas.popitem(last=False)
+
+    def _carregada(self, nome_turma: str) -> Optional[AnalisadorAcademico]:
+        analisador = self.carregadas.get(nome_turma)
+        if analisador is not None:
+            self.carregadas.move_to_end(nome_turma)
+        return analisador
+
+    def _fim_carga(self, nome_turma: str, lock_carga):
+        with self._lock:
+            if self._carregando.get(nome_turma) is lock_carga:
+                del self._carregando[nome_turma]
+
+    def __getitem__(self, nome_turma: str) -> AnalisadorAcademico:
+        with self._lock:
+            analisador = self._carregada(nome_turma)
+            if analisador is not None:
+                return analisador
+            if nome_turma not in self.arquivos:
+                raise KeyError(nome_turma)
+            lock_carga = self._carregando.setdefault(nome_turma, threading.Lock())
+
+        # A leitura da planilha acontece fora do lock do registro: só quem pede esta turma espera
+        with lock_carga:
+            with self._lock:
+                analisador = self._carregada(nome_turma)
+                if analisador is not None:
+                    return analisador
+                caminho_arquivo = self.arquivos.get(nome_turma)
+                if caminho_arquivo is None:
+                    raise KeyError(nome_turma)
+
+            try:
+                analisador = AnalisadorAcademico(caminho_arquivo, compacto=self.compacto)
+            except Exception as e:
+                self._fim_carga(nome_turma, lock_carga)
+                print(f"Erro ao carregar turma {nome_turma}: {e}")
+                raise KeyError(nome_turma) from e
+
+            with self._lock:
+                self._fim_carga(nome_turma, lock_carga)
+                # Não publica se a turma foi removida, trocada de arquivo ou substituída nesse meio-tempo
+                atual = self._carregada(nome_turma)
+                if atual is not None:
+                    return atual
+                if self.arquivos.get(nome_turma) == caminho_arquivo:
+                    self._guardar(nome_turma, analisador)
+            return analisador
+
+    def __setitem__(self, nome_turma: str, analisador: AnalisadorAcademico):
+        with self._lock:
+            self.arquivos[nome_turma] = analisador.caminho_planilha
+            self._guardar(nome_turma, analisador)
+
+    def __delitem__(self, nome_turma: str):
+        with self._lock:
+            del self.arquivos[nome_turma]
+            self.carregadas.pop(nome_turma, None)
+
+    def __contains__(self, nome_turma) -> bool:
+        return nome_turma in self.arquivos
+
+    def __iter__(self):
+        return iter(list(self.arquivos))
+
+    def __len__(self) -> int:
+        return len(self.arquivos)
+
+    def items(self) -> List[Tuple[str, AnalisadorAcademico]]:
+        """Pares (nome, analisador) só das turmas já carregadas; nunca carrega planilhas"""
+        return self.carregadas_agora()
+
+    def values(self) -> List[AnalisadorAcademico]:
+        """Analisadores já carregados (ver items)"""
+        return [analisador for _, analisador in self.items()]
+
+class CuboNotas:
+    """Cubo colunar com as notas de todas as turmas (turma, curso, ano, aluno, disciplina, trimestre -> nota).
+
+    Cada turma é um bloco com uma linha por par (aluno, disciplina) do tensor do analisador,
+    trocado ou descartado inteiro em adicionar/remover, junto com um resumo da turma calculado
+    nesse momento. As colunas concatenadas de todos os blocos são remontadas sob demanda na
+    primeira consulta depois de uma mudança.
+    """
+
+    def __init__(self):
+        self.blocos = {}  # nome da turma -> colunas da turma
+        self._colunas = None
+        self._lock = threading.RLock()
+
+    def adicionar(self, nome_turma: str, analisador: AnalisadorAcademico, curso: str, ano: int):
+        """Insere (ou substitui) o bloco de uma turma a partir do seu analisador"""
+        total_alunos, total_disciplinas = analisador.medias.shape
+        bloco = {
+            'curso': curso,
+            'ano': ano,
+            'disciplinas': list(analisador.disciplinas),
+            'total_alunos': total_alunos,
+            'total_disciplinas': total_disciplinas,
+            # Linhas da planilha e notas lançadas por trimestre (base do trimestre atual)
+            'linhas': len(analisador.df),
+            'notas_lancadas': np.count_nonzero(analisador.notas_validas, axis=0),
+            'aluno': np.repeat(np.arange(total_alunos), total_disciplinas),
+            'disciplina': np.tile(np.arange(total_disciplinas), total_alunos),
+            'notas': analisador.notas.reshape(-1, len(COLUNAS_NOTAS)),
+            'media': analisador.medias.ravel(),
+            'tem_notas': analisador.tem_notas.ravel(),
+            'matriculado': analisador.matriculado.ravel(),
+            'situacao': analisador.situacoes.ravel()
+        }
+        # Calculado uma vez por versão da turma e combinado depois para qualquer filtro
+        bloco['resumo'] = self._resumir_bloco(bloco)
+        with self._lock:
+            self.blocos[nome_turma] = bloco
+            self._colunas = None
+
+    def remover(self, nome_turma: str):
+        """Descarta o bloco de uma turma"""
+        with self._lock:
+            if self.blocos.pop(nome_turma, None) is not None:
+                self._colunas = None
+
+    def __contains__(self, nome_turma) -> bool:
+        return nome_turma in self.blocos
+
+    def __len__(self) -> int:
+        return len(self.blocos)
+
+    def memoria_bytes(self) -> int:
+        """Memória aproximada das colunas dos blocos"""
+        with self._lock:
+            return int(sum(coluna.nbytes for bloco in self.blocos.values()
+                           for coluna in bloco.values() if isinstance(coluna, np.ndarray)))
+
+    def colunas(self) -> Dict[str, Any]:
+        """Colunas concatenadas de todas as turmas (remontadas só quando algum bloco mudou)"""
+        with self._lock:
+            if self._colunas is None:
+                self._colunas = self._montar()
+            return self._colunas
+
+    def _montar(self) -> Dict[str, Any]:
+        nomes = list(self.blocos)
+        blocos = [self.blocos[n] for n in nomes]
+        pares = np.array([len(b['media']) for b in blocos], dtype=np.intp)
+        alunos = np.array([b['total_alunos'] for b in blocos], dtype=np.intp)
+        disciplinas = np.array([b['total_disciplinas'] for b in blocos], dtype=np.intp)
+        cursos, curso_turma = np.unique([b['curso'] for b in blocos], return_inverse=True)
+
+        def concatenar(campo, vazio):
+            return np.concatenate([b[campo] for b in blocos]) if blocos else vazio
+
+        turma = np.repeat(np.arange(len(nomes)), pares)
+        disciplinas_turmas = [disciplina for b in blocos for disciplina in b['disciplinas']]
+
+        # Nome simples de cada disciplina de cada turma, para consolidar entre turmas
+        nomes_simples = pd.Series([
+            disciplina.split(' - ')[1] if isinstance(disciplina, str) and ' - ' in disciplina else disciplina
+            for disciplina in disciplinas_turmas
+        ], dtype=object)
+        nome_disciplina, nomes_disciplinas = pd.factorize(nomes_simples)
+        inicio_alunos = np.concatenate(([0], np.cumsum(alunos)[:-1])).astype(np.intp)
+        inicio_disciplinas = np.concatenate(([0], np.cumsum(disciplinas)[:-1])).astype(np.intp)
+
+        return {
+            'turmas': nomes,
+            'indice_turmas': {nome: t for t, nome in enumerate(nomes)},
+            'cursos': cursos.tolist(),
+            'disciplinas': disciplinas_turmas,
+            'nome_disciplina': nome_disciplina,
+            'nomes_disciplinas': list(nomes_disciplinas),
+            'linhas': np.array([b['linhas'] for b in blocos], dtype=np.intp),
+            'notas_lancadas': np.array([b['notas_lancadas'] for b in blocos]).reshape(-1, len(COLUNAS_NOTAS)),
+            'total_alunos': alunos,
+            'total_disciplinas': disciplinas,
+            # Uma linha por par (aluno, disciplina) de cada turma
+            'turma': turma,
+            'curso': np.asarray(curso_turma, dtype=np.intp)[turma],
+            'ano': np.array([b['ano'] for b in blocos], dtype=np.int16)[turma],
+            # Códigos globais: aluno e disciplina são únicos por turma
+            'aluno': concatenar('aluno', np.empty(0, dtype=np.intp)) + inicio_alunos[turma],
+            'aluno_turma': np.repeat(np.arange(len(nomes)), alunos),
+            'disciplina': concatenar('disciplina', np.empty(0, dtype=np.intp)) + inicio_disciplinas[turma],
+            'disciplina_turma': np.repeat(np.arange(len(nomes)), disciplinas),
+            'notas': concatenar('notas', np.empty((0, len(COLUNAS_NOTAS)))),
+            'media': concatenar('media', np.empty(0)),
+            'tem_notas': concatenar('tem_notas', np.empty(0, dtype=bool)),
+            'matriculado': concatenar('matriculado', np.empty(0, dtype=bool)),
+            'situacao': concatenar('situacao', np.empty(0, dtype=np.int8))
+        }
+
+    @staticmethod
+    def _resumir_bloco(bloco: Dict[str, Any]) -> Dict[str, Any]:
+        """Resumo de uma turma (média, situação dos alunos, trimestre e dificuldade por disciplina)"""
+        formato = (bloco['total_alunos'], bloco['total_disciplinas'])
+        media = bloco['media'].reshape(formato)
+        tem_notas = bloco['tem_notas'].reshape(formato)
+
+        situacao_aluno = situacao_geral_alunos(bloco['situacao'].reshape(formato), tem_notas)
+        contagem = np.bincount(situacao_aluno, minlength=len(SITUACOES)).tolist()
+
+        percentuais_trimestre = (bloco['notas_lancadas'] * 100 / bloco['linhas']).tolist() if bloco['linhas'] else [0, 0, 0]
+        trimestre_atual, status, trimestres_completos = classificar_trimestre(percentuais_trimestre)
+
+        # Disciplinas da mais difícil para a mais fácil (empates na ordem da planilha)
+        com_dificuldade = np.count_nonzero(tem_notas & (media < LIMITE_APROVACAO), axis=0)
+        com_notas = np.count_nonzero(tem_notas, axis=0)
+        matriculados = np.count_nonzero(bloco['matriculado'].reshape(formato), axis=0)
+        percentuais = com_dificuldade / matriculados * 100
+        dificuldade = [
+            (bloco['disciplinas'][j], float(percentuais[j]), int(com_dificuldade[j]), int(com_notas[j]))
+            for j in np.argsort(-percentuais, kind='stable').tolist()
+        ]
+
+        return {
+            'total_alunos': bloco['total_alunos'],
+            'total_disciplinas': bloco['total_disciplinas'],
+            'media_geral': np.mean(bloco['media']) if len(bloco['media']) else 0,
+            'aprovados': contagem[APROVADO],
+            'recuperacao': contagem[RECUPERACAO],
+            'reprovados': contagem[REPROVADO],
+            'trimestre_atual': trimestre_atual,
+            'status_trimestre': status,
+            'trimestres_completos': trimestres_completos,
+            'dificuldade': dificuldade
+        }
+
+    def resumo_turmas(self, nomes_turmas: List[str]) -> List[Dict[str, Any]]:
+        """Resumos já calculados das turmas pedidas (média, situação dos alunos e trimestre atual)"""
+        with self._lock:
+            resumos = [(nome, self.blocos[nome]['resumo']) for nome in nomes_turmas]
+        return [
+            {'nome': nome, **{campo: valor for campo, valor in resumo.items() if campo != 'dificuldade'}}
+            for nome, resumo in resumos
+        ]
+
+    def dificuldade_disciplinas(self, nomes_turmas: List[str]) -> List[Tuple[str, str, float, int, int]]:
+        """(turma, disciplina, % com dificuldade, alunos com dificuldade, alunos com nota) por turma e disciplina.
+
+        Turmas na ordem pedida; dentro de cada turma, da disciplina mais difícil para a mais fácil.
+        """
+        with self._lock:
+            resumos = [(nome, self.blocos[nome]['resumo']) for nome in nomes_turmas]
+        return [(nome, *linha) for nome, resumo in resumos for linha in resumo['dificuldade']]
+
+    def disciplinas_turmas(self, nomes_turmas: List[str]) -> Dict[str, List[str]]:
+        """Disciplinas (nome completo, como na planilha) de cada turma pedida"""
+        with self._lock:
+            return {nome: list(self.blocos[nome]['disciplinas']) for nome in nomes_turmas}
+
+    def simular_limites(self, nomes_turmas: List[str], limite_aprovacao: float = LIMITE_APROVACAO,
+                        limite_recuperacao: float = LIMITE_RECUPERACAO,
+                        limite_destaque: float = LIMITE_DESTAQUE) -> Dict[str, Dict[str, Any]]:
+        """Resumo atual e simulado de cada turma pedida, reclassificando as médias guardadas nos blocos"""
+        with self._lock:
+            blocos = [(nome, self.blocos[nome]) for nome in nomes_turmas]
+
+        simulacoes = {}
+        for nome, bloco in blocos:
+            formato = (bloco['total_alunos'], bloco['total_disciplinas'])
+            media = bloco['media'].reshape(formato)
+            tem_notas = bloco['tem_notas'].reshape(formato)
+            nomes_disciplinas = [
+                disciplina.split(' - ')[1] if isinstance(disciplina, str) and ' - ' in disciplina else disciplina
+                for disciplina in bloco['disciplinas']
+            ]
+            atual = resumir_situacoes(media, tem_notas, nomes_disciplinas)
+            simulado = resumir_situacoes(media, tem_notas, nomes_disciplinas,
+                                         limite_aprovacao, limite_recuperacao, limite_destaque)
+            simulacoes[nome] = {'atual': atual, 'simulado': simulado, 'diferenca': diferenca_resumos(atual, simulado)}
+        return simulacoes
+
+    def estatisticas_disciplinas(self, nomes_turmas: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Estatísticas de cada disciplina (pelo nome simples) somando as turmas pedidas.
+
+        Uma passada agrupada pelas linhas do cubo dá, por disciplina, alunos com nota,
+        matriculados, alunos com dificuldade, média e desvio padrão das médias dos alunos,
+        além da soma dos percentuais de dificuldade de cada turma (para a média simples).
+        """
+        c = self.colunas()
+        selecionadas = np.array([c['indice_turmas'][n] for n in nomes_turmas], dtype=np.intp)
+        total_grupos = len(c['disciplinas'])
+        total_nomes = len(c['nomes_disciplinas'])
+
+        linhas = np.isin(c['turma'], selecionadas)
+        grupo = c['disciplina'][linhas]
+        tem_notas = c['tem_notas'][linhas]
+        media = np.where(tem_notas, c['media'][linhas], 0.0)
+
+        # Por (turma, disciplina)
+        com_notas = np.bincount(grupo, weights=tem_notas, minlength=total_grupos)
+        com_dificuldade = np.bincount(grupo, weights=tem_notas & (media < LIMITE_APROVACAO), minlength=total_grupos)
+        matriculados = np.bincount(grupo, weights=c['matriculado'][linhas], minlength=total_grupos)
+        soma_medias = np.bincount(grupo, weights=media, minlength=total_grupos)
+
+        # Por disciplina, somando as turmas (grupos de turmas não pedidas estão zerados)
+        nome = c['nome_disciplina']
+        percentuais = np.divide(com_dificuldade * 100, matriculados, out=np.zeros(total_grupos), where=matriculados > 0)
+
+        def somar(valores):
+            return np.bincount(nome, weights=valores, minlength=total_nomes)
+
+        turmas = np.bincount(nome[np.isin(c['disciplina_turma'], selecionadas)], minlength=total_nomes)
+        alunos = somar(com_notas)
+        medias = np.divide(somar(soma_medias), alunos, out=np.zeros(total_nomes), where=alunos > 0)
+        soma_percentuais = somar(percentuais)
+        total_dificuldade = somar(com_dificuldade)
+        total_matriculados = somar(matriculados)
+
+        # Desvio padrão populacional em torno da média já consolidada
+        desvios = np.where(tem_notas, media - medias[nome[grupo]], 0.0)
+        variancias = np.divide(np.bincount(nome[grupo], weights=desvios ** 2, minlength=total_nomes), alunos,
+                               out=np.zeros(total_nomes), where=alunos > 0)
+
+        resultado = {}
+        for k in np.flatnonzero(turmas).tolist():
+            resultado[c['nomes_disciplinas'][k]] = {
+                'total_turmas': int(turmas[k]),
+                'soma_percentuais': float(soma_percentuais[k]),
+                'com_dificuldade': int(total_dificuldade[k]),
+                'matriculados': int(total_matriculados[k]),
+                'com_notas': int(alunos[k]),
+                'media_geral': float(medias[k]),
+                'desvio_padrao': float(np.sqrt(variancias[k]))
+            }
+        return resultado
+
+def _carregar_analisador(caminho_arquivo: str, compacto: bool) -> AnalisadorAcademico:
+    """Constrói um analisador num processo de carga (o resultado volta serializado)"""
+    return AnalisadorAcademico(caminho_arquivo, compacto=compacto)
+
+# Fila em que cada processo de carga avisa quando começa uma carga (definida em _iniciar_processo_carga)
+_inicios_carga = None
+
+def _iniciar_processo_carga(inicios):
+    global _inicios_carga
+    _inicios_carga = inicios
+
+def _executar_carga(id_carga: int, caminho_arquivo: str, compacto: bool) -> AnalisadorAcademico:
+    """Avisa o início da carga (o tempo limite conta a partir daqui) e carrega a turma"""
+    if _inicios_carga is not None:
+        _inicios_carga.put(id_carga)
+    return _carregar_analisador(caminho_arquivo, compacto)
 
 class GerenciadorTurmas:
     """Gerencia múltiplas turmas e permite comparações entre elas"""
     
-    def __init__(self, diretorio_turmas: str = "turmas"):
+    def __init__(self, diretorio_turmas: str = "turmas", max_turmas_carregadas: int = MAX_TURMAS_CARREGADAS,
+                 processos_carregamento: int = 0, pre_carregar: bool = False, compacto: bool = True,
+                 tempo_limite_turma: Optional[float] = None):
+        """processos_carregamento > 1 ativa a carga paralela de planilhas; pre_carregar
+        carrega todas as turmas já na inicialização; compacto usa a representação
+        compacta dos analisadores (ver AnalisadorAcademico); tempo_limite_turma
+        (segundos) descarta das comparações a turma cuja carga demorar mais que isso."""
         self.diretorio_turmas = diretorio_turmas
-        self.turmas = {}
+        self.arquivo_manifesto = os.path.join(diretorio_turmas, DIRETORIO_CACHE_PLANILHAS, 'manifesto.json')
+        self.manifesto = {}
+        self._lock_manifesto = threading.RLock()
+        self.processos_carregamento = processos_carregamento
+        self.tempo_limite_turma = tempo_limite_turma
+        self._pool = None
+        self._processos_pool = 0
+        self._inicios_pool = None
+        self._proximo_id_carga = 0
+        self._lock_pool = threading.Lock()
+        self.falhas_carga = {}
+        self.turmas = RegistroTurmas(max_turmas_carregadas, compacto)
+        self.cubo = CuboNotas()
         self.criar_diretorio_se_nao_existe()
         self.carregar_turmas()
+        if pre_carregar:
+            self.carregar_em_paralelo()
     
     def criar_diretorio_se_nao_existe(self):
         """Cria o diretório de turmas se não existir"""
@@ -35,11 +465,30 @@ class GerenciadorTurmas:
             primeira_palavra = nome_turma.split()[0] if nome_turma.split() else 'Outros'
             return primeira_palavra.title()
     
+    def extrair_ano_da_turma(self, nome_turma: str) -> int:
+        """Extrai o ano (quatro dígitos) do nome da turma; 0 quando não houver"""
+        ano = re.search(r'\d{4}', nome_turma)
+        return int(ano.group()) if ano else 0
+
+    def normalizar_nome_turma(self, nome_turma: str) -> str:
+        """Nome canônico da turma, igual para o arquivo e para o upload ('info_a 2022' -> 'Info A 2022')"""
+        return ' '.join(nome_turma.replace('_', ' ').split()).title()
+
+    def caminho_arquivo_turma(self, nome_turma: str) -> str:
+        """Caminho da planilha de uma turma no diretório de turmas (exista ou não)"""
+        nome_arquivo = self.normalizar_nome_turma(nome_turma).lower().replace(' ', '_') + '.xlsx'
+        return os.path.join(self.diretorio_turmas, nome_arquivo)
+
+    def curso_da_turma(self, nome_turma: str) -> str:
+        """Curso da turma registrado no manifesto (extraído do nome se não houver registro)"""
+        registro = self.manifesto.get(nome_turma)
+        return registro['curso'] if registro else self.extrair_curso_da_turma(nome_turma)
+
     def listar_cursos(self) -> List[str]:
         """Retorna lista de cursos disponíveis"""
         cursos = set()
         for nome_turma in self.turmas.keys():
-            curso = self.extrair_curso_da_turma(nome_turma)
+            curso = self.curso_da_turma(nome_turma)
             cursos.add(curso)
         return sorted(list(cursos))
     
@@ -48,7 +497,7 @@ class GerenciadorTurmas:
         turmas_por_curso = {}
         
         for nome_turma in self.turmas.keys():
-            curso_turma = self.extrair_curso_da_turma(nome_turma)
+            curso_turma = self.curso_da_turma(nome_turma)
             
             if curso and curso_turma != curso:
                 continue
@@ -61,9 +510,7 @@ class GerenciadorTurmas:
     
     def obter_arquivo_turma(self, nome_turma: str) -> Optional[str]:
         """Retorna o caminho do arquivo de uma turma específica"""
-        # Normalizar nome da turma
-        nome_arquivo = nome_turma.lower().replace(' ', '_') + '.xlsx'
-        caminho_arquivo = os.path.join(self.diretorio_turmas, nome_arquivo)
+        caminho_arquivo = self.turmas.arquivos.get(nome_turma) or self.caminho_arquivo_turma(nome_turma)
 
         if os.path.exists(caminho_arquivo):
             return caminho_arquivo
@@ -71,40 +518,328 @@ class GerenciadorTurmas:
         return None
 
     def carregar_turmas(self):
-        """Carrega todas as turmas disponíveis"""
-        self.turmas = {}
+        """Registra todas as turmas disponíveis (os analisadores são carregados sob demanda)"""
+        self.turmas = RegistroTurmas(self.turmas.max_carregadas, self.turmas.compacto)
+        self.cubo = CuboNotas()
+        self.carregar_manifesto()
 
-        # Carregar turmas do diretório
+        # Registrar turmas do diretório
         if os.path.exists(self.diretorio_turmas):
             for arquivo in os.listdir(self.diretorio_turmas):
                 if arquivo.endswith('.xlsx'):
-                    nome_turma = arquivo.replace('.xlsx', '').replace('_', ' ').title()
+                    nome_turma = self.normalizar_nome_turma(arquivo[:-len('.xlsx')])
                     caminho_arquivo = os.path.join(self.diretorio_turmas, arquivo)
-                    try:
-                        self.turmas[nome_turma] = AnalisadorAcademico(caminho_arquivo)
-                    except Exception as e:
-                        print(f"Erro ao carregar turma {nome_turma}: {e}")
+                    self.turmas.registrar(nome_turma, caminho_arquivo)
+
+        # Manifesto com exatamente um registro por turma registrada
+        with self._lock_manifesto:
+            alterado = False
+            for nome_turma in list(self.manifesto):
+                if nome_turma not in self.turmas:
+                    del self.manifesto[nome_turma]
+                    alterado = True
+            for nome_turma, caminho_arquivo in self.turmas.arquivos.items():
+                registro = self.manifesto.get(nome_turma)
+                if registro is None or registro.get('arquivo') != caminho_arquivo:
+                    self.manifesto[nome_turma] = self._novo_registro(nome_turma, caminho_arquivo)
+                    alterado = True
+            if alterado:
+                self.salvar_manifesto()
+
+    def carregar_manifesto(self):
+        """Carrega o manifesto com os metadados das turmas"""
+        self.manifesto = {}
+        if os.path.exists(self.arquivo_manifesto):
+            try:
+                with open(self.arquivo_manifesto, 'r', encoding='utf-8') as f:
+                    dados = json.load(f)
+                if dados.get('versao') == VERSAO_MANIFESTO:
+                    self.manifesto = dados['turmas']
+            except Exception as e:
+                print(f"Erro ao carregar manifesto de turmas: {e}")
+
+    def salvar_manifesto(self):
+        """Salva o manifesto com os metadados das turmas (troca atômica do arquivo)"""
+        with self._lock_manifesto:
+            try:
+                os.makedirs(os.path.dirname(self.arquivo_manifesto), exist_ok=True)
+                temporario = self.arquivo_manifesto + '.tmp'
+                with open(temporario, 'w', encoding='utf-8') as f:
+                    json.dump({'versao': VERSAO_MANIFESTO, 'turmas': self.manifesto}, f, indent=2, ensure_ascii=False)
+                os.replace(temporario, self.arquivo_manifesto)
+            except Exception as e:
+                print(f"Erro ao salvar manifesto de turmas: {e}")
+
+    def _novo_registro(self, nome_turma: str, caminho_arquivo: str) -> Dict[str, Any]:
+        """Registro do manifesto de uma turma ainda não analisada (contagens vazias)"""
+        agora = datetime.now().isoformat(timespec='seconds')
+        return {
+            'nome': nome_turma,
+            'curso': self.extrair_curso_da_turma(nome_turma),
+            'ano': self.extrair_ano_da_turma(nome_turma),
+            'arquivo': caminho_arquivo,
+            'hash': None,
+            'total_linhas': None,
+            'total_alunos': None,
+            'total_disciplinas': None,
+            'tamanho': None,
+            'modificado_em': None,
+            'criado_em': agora,
+            'atualizado_em': agora
+        }
+
+    def atualizar_manifesto(self, nome_turma: str, analisador: AnalisadorAcademico) -> Dict[str, Any]:
+        """Grava no manifesto hash, contagens e datas da versão atual da planilha de uma turma"""
+        info = os.stat(analisador.caminho_planilha)
+        with self._lock_manifesto:
+            registro = self.manifesto.get(nome_turma) or self._novo_registro(nome_turma, analisador.caminho_planilha)
+            registro = dict(registro)
+            if registro['hash'] is not None and registro['hash'] != analisador.versao_dados:
+                registro['atualizado_em'] = datetime.now().isoformat(timespec='seconds')
+            registro.update({
+                'arquivo': analisador.caminho_planilha,
+                'hash': analisador.versao_dados,
+                'total_linhas': len(analisador.df),
+                'total_alunos': len(analisador.alunos),
+                'total_disciplinas': len(analisador.disciplinas),
+                'tamanho': info.st_size,
+                'modificado_em': info.st_mtime
+            })
+            self.manifesto[nome_turma] = registro
+            self.salvar_manifesto()
+        return registro
+
+    def remover_do_manifesto(self, nome_turma: str):
+        """Remove o registro de uma turma do manifesto"""
+        with self._lock_manifesto:
+            if self.manifesto.pop(nome_turma, None) is not None:
+                self.salvar_manifesto()
+
+    def obter_metadados_turma(self, nome_turma: str) -> Optional[Dict[str, Any]]:
+        """Retorna o registro do manifesto de uma turma (curso, ano, hash, contagens e datas).
+
+        O registro vale enquanto a planilha não mudar (tamanho e data de modificação);
+        só carrega o analisador quando ele ainda não tem contagens ou está desatualizado.
+        """
+        caminho_arquivo = self.turmas.arquivos.get(nome_turma)
+        if not caminho_arquivo:
+            return None
+
+        try:
+            info = os.stat(caminho_arquivo)
+        except OSError:
+            return None
+
+        registro = self.manifesto.get(nome_turma)
+        if (registro and registro.get('total_alunos') is not None
+                and registro.get('tamanho') == info.st_size and registro.get('modificado_em') == info.st_mtime):
+            return registro
+
+        analisador = self.obter_turma(nome_turma)
+        if analisador is None:
+            return None
+
+        return self.atualizar_manifesto(nome_turma, analisador)
+    
+    def _assinatura_arquivo(self, nome_turma: str) -> Optional[Tuple[int, int]]:
+        """Tamanho e data de modificação da planilha registrada (None se não existir)"""
+        try:
+            info = os.stat(self.turmas.arquivos[nome_turma])
+        except (KeyError, OSError):
+            return None
+        return info.st_size, info.st_mtime_ns
+
+    def _registrar_falha(self, nome_turma: str):
+        """Marca a versão atual da planilha como falha, para não tentar carregá-la a cada requisição"""
+        self.falhas_carga[nome_turma] = self._assinatura_arquivo(nome_turma)
+
+    def falhou_carga(self, nome_turma: str) -> bool:
+        """True se esta versão da planilha já falhou (erro ou tempo limite); uma nova versão é tentada de novo"""
+        return nome_turma in self.falhas_carga and self.falhas_carga[nome_turma] == self._assinatura_arquivo(nome_turma)
+
+    def _obter_pool(self, processos: int):
+        """Pool de processos de carga, criado uma vez e reaproveitado entre chamadas"""
+        if self._pool is None or self._processos_pool != processos:
+            self._encerrar_pool()
+            self._inicios_pool = multiprocessing.Queue()
+            self._pool = multiprocessing.Pool(processos, initializer=_iniciar_processo_carga,
+                                              initargs=(self._inicios_pool,))
+            self._processos_pool = processos
+        return self._pool
+
+    def _encerrar_pool(self):
+        """Mata os processos de carga (inclusive os presos numa planilha); o próximo uso cria outros"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+            self._inicios_pool.close()
+            self._inicios_pool = None
+
+    def _enviar_carga(self, pool, nome_turma: str) -> Tuple[int, Any]:
+        """Envia a carga de uma turma ao pool; retorna o id usado no aviso de início e o envio"""
+        self._proximo_id_carga += 1
+        envio = pool.apply_async(_executar_carga, (self._proximo_id_carga, self.turmas.arquivos[nome_turma],
+                                                   self.turmas.compacto))
+        return self._proximo_id_carga, envio
+
+    def _cargas_iniciadas(self, espera: float) -> List[int]:
+        """Ids das cargas que começaram desde a última chamada (espera até `espera` segundos pela primeira)"""
+        iniciadas = []
+        try:
+            iniciadas.append(self._inicios_pool.get(timeout=espera))
+            while True:
+                iniciadas.append(self._inicios_pool.get_nowait())
+        except queue.Empty:
+            pass
+        return iniciadas
+
+    def encerrar(self):
+        """Libera os processos de carga"""
+        with self._lock_pool:
+            self._encerrar_pool()
+
+    def carregar_em_paralelo(self, nomes_turmas: Optional[List[str]] = None,
+                             processos: Optional[int] = None,
+                             tempo_limite: Optional[float] = None) -> Dict[str, AnalisadorAcademico]:
+        """Carrega várias turmas distribuindo leitura e pré-processamento entre processos.
+
+        Turmas já carregadas são reaproveitadas. Retorna os analisadores das turmas
+        pedidas (todas as registradas quando nomes_turmas é None) que carregaram.
+        Planilhas com erro ou que não terminarem em tempo_limite segundos (contados a
+        partir do momento em que um processo começa a carregá-las) ficam de fora e não
+        são tentadas de novo enquanto o arquivo não mudar. Turmas que ainda esperavam na
+        fila do pool nunca contam como falha: os processos presos numa carga só são
+        encerrados quando não há outra carga em andamento, e as que não começaram são
+        reenviadas a um pool novo.
+        """
+        nomes = self.listar_turmas() if nomes_turmas is None else [n for n in nomes_turmas if n in self.turmas]
+        processos = processos or self.processos_carregamento or os.cpu_count() or 1
+
+        resultado = {}
+        for nome_turma in nomes:
+            analisador = self.turmas.obter_carregada(nome_turma)
+            if analisador is not None:
+                resultado[nome_turma] = analisador
+        pendentes = [n for n in nomes if n not in resultado and not self.falhou_carga(n)]
+
+        # Sem tempo limite a carga sequencial basta; com ele, até uma turma vai para o pool
+        if not tempo_limite and (processos <= 1 or len(pendentes) <= 1):
+            for nome_turma in pendentes:
+                analisador = self.obter_turma(nome_turma)
+                if analisador is None:
+                    self._registrar_falha(nome_turma)
+                else:
+                    resultado[nome_turma] = analisador
+        elif pendentes:
+            with self._lock_pool:
+                pool = self._obter_pool(processos)
+                aguardando = {}  # id da carga -> (nome da turma, envio)
+                for nome_turma in pendentes:
+                    id_carga, envio = self._enviar_carga(pool, nome_turma)
+                    aguardando[id_carga] = (nome_turma, envio)
+                inicios = {}  # id da carga -> momento em que um processo começou a carregá-la
+                presos = 0
+
+                while aguardando:
+                    agora = time.monotonic()
+                    for id_carga in self._cargas_iniciadas(0.01):
+                        inicios.setdefault(id_carga, agora)
+
+                    for id_carga, (nome_turma, envio) in list(aguardando.items()):
+                        if envio.ready():
+                            del aguardando[id_carga]
+                            try:
+                                analisador = envio.get()
+                            except Exception as e:
+                                print(f"Erro ao carregar turma {nome_turma}: {e}")
+                                self._registrar_falha(nome_turma)
+                                continue
+                            self.turmas[nome_turma] = analisador
+                            resultado[nome_turma] = analisador
+                        elif tempo_limite and id_carga in inicios and agora - inicios[id_carga] > tempo_limite:
+                            print(f"Tempo limite excedido ao carregar turma {nome_turma}")
+                            del aguardando[id_carga]
+                            self._registrar_falha(nome_turma)
+                            presos += 1
+
+                    # Só restam turmas que não começaram e há processos presos: trocar o pool
+                    # (nenhuma carga em andamento é perdida) e reenviá-las
+                    if presos and aguardando and not any(id_carga in inicios for id_carga in aguardando):
+                        self._encerrar_pool()
+                        pool = self._obter_pool(processos)
+                        reenviar = [nome_turma for nome_turma, _ in aguardando.values()]
+                        aguardando = {}
+                        for nome_turma in reenviar:
+                            id_carga, envio = self._enviar_carga(pool, nome_turma)
+                            aguardando[id_carga] = (nome_turma, envio)
+                        presos = 0
+
+                # Processos ainda ocupados com cargas que estouraram o prazo não voltam ao pool
+                if presos:
+                    self._encerrar_pool()
+
+        # Manter a ordem pedida
+        return {n: resultado[n] for n in nomes if n in resultado}
+    
+    def relatorio_memoria(self) -> Dict[str, Any]:
+        """Memória ocupada por cada turma carregada (turmas não carregadas não ocupam memória)"""
+        turmas = []
+        for nome_turma, analisador in self.turmas.carregadas_agora():
+            turmas.append({'nome': nome_turma, **analisador.relatorio_memoria()})
+
+        return {
+            'turmas': turmas,
+            'turmas_registradas': len(self.turmas),
+            'turmas_carregadas': len(turmas),
+            'max_turmas_carregadas': self.turmas.max_carregadas,
+            'total_bytes': sum(t['total_bytes'] for t in turmas),
+            'turmas_no_cubo': len(self.cubo),
+            'cubo_bytes': self.cubo.memoria_bytes()
+        }
     
     def listar_turmas(self) -> List[str]:
         """Retorna lista de nomes das turmas"""
         return list(self.turmas.keys())
     
     def obter_turma(self, nome_turma: str) -> AnalisadorAcademico:
-        """Retorna o analisador de uma turma específica"""
+        """Retorna o analisador de uma turma específica (carregando-o se necessário)"""
         return self.turmas.get(nome_turma)
     
     def adicionar_turma(self, nome_turma: str, arquivo_excel) -> bool:
-        """Adiciona uma nova turma a partir de um arquivo Excel"""
+        """Adiciona uma turma a partir de um arquivo Excel, ou substitui a planilha de uma existente.
+
+        A nova versão é lida e pré-processada antes de tocar no disco; só então o arquivo
+        é trocado atomicamente e o novo analisador publicado no registro, no cubo e no
+        manifesto. Se a planilha for inválida, a versão anterior continua em uso.
+        """
+        nome_turma = self.normalizar_nome_turma(nome_turma)
+        # Turma já registrada mantém o arquivo atual (que pode não seguir o nome canônico)
+        caminho_arquivo = self.turmas.arquivos.get(nome_turma) or self.caminho_arquivo_turma(nome_turma)
         try:
-            # Sanitizar nome do arquivo
-            nome_arquivo = nome_turma.lower().replace(' ', '_') + '.xlsx'
-            caminho_arquivo = os.path.join(self.diretorio_turmas, nome_arquivo)
-            
-            # Salvar arquivo
-            arquivo_excel.save(caminho_arquivo)
-            
-            # Carregar analisador
-            self.turmas[nome_turma] = AnalisadorAcademico(caminho_arquivo)
+            buffer = io.BytesIO()
+            arquivo_excel.save(buffer)
+            analisador = AnalisadorAcademico(caminho_arquivo, compacto=self.turmas.compacto,
+                                             conteudo=buffer.getvalue())
+        except Exception as e:
+            print(f"Erro ao ler planilha da turma {nome_turma}: {e}")
+            return False
+
+        try:
+            # Troca atômica do arquivo
+            temporario = caminho_arquivo + '.tmp'
+            with open(temporario, 'wb') as f:
+                f.write(buffer.getvalue())
+            os.replace(temporario, caminho_arquivo)
+
+            # Publicar a nova versão; quem já tem a anterior em mãos termina com ela
+            anterior = self.turmas.obter_carregada(nome_turma)
+            self.turmas[nome_turma] = analisador
+            self.falhas_carga.pop(nome_turma, None)
+            self.adicionar_ao_cubo(nome_turma, analisador)
+            self.atualizar_manifesto(nome_turma, analisador)
+            if anterior is not None:
+                anterior.limpar_cache()
             
             return True
         except Exception as e:
@@ -113,15 +848,21 @@ class GerenciadorTurmas:
     
     def remover_turma(self, nome_turma: str) -> bool:
         """Remove uma turma"""
+        nome_turma = self.normalizar_nome_turma(nome_turma)
         try:
             if nome_turma in self.turmas:
-                # Remover do dicionário
-                del self.turmas[nome_turma]
+                caminho_arquivo = self.turmas.arquivos.get(nome_turma)
+
+                # Remover do registro e descartar resultados memorizados
+                analisador = self.turmas.remover(nome_turma)
+                if analisador is not None:
+                    analisador.limpar_cache()
+                self.cubo.remover(nome_turma)
+                self.falhas_carga.pop(nome_turma, None)
+                self.remover_do_manifesto(nome_turma)
                 
-                # Remover arquivo se existir
-                nome_arquivo = nome_turma.lower().replace(' ', '_') + '.xlsx'
-                caminho_arquivo = os.path.join(self.diretorio_turmas, nome_arquivo)
-                if os.path.exists(caminho_arquivo):
+                # Remover o arquivo registrado para a turma, se existir
+                if caminho_arquivo and os.path.exists(caminho_arquivo):
                     os.remove(caminho_arquivo)
                 
                 return True
@@ -129,22 +870,73 @@ class GerenciadorTurmas:
             print(f"Erro ao remover turma {nome_turma}: {e}")
         return False
     
-    def comparar_turmas(self, curso: str = None, nomes_turmas: Optional[List[str]] = None) -> Dict[str, Any]:
+    def filtrar_nomes_turmas(self, curso: str = None, nomes_turmas: Optional[List[str]] = None) -> List[str]:
+        """Retorna os nomes das turmas do curso e/ou da lista de nomes informados"""
+        nomes = self.listar_turmas()
+        if curso:
+            nomes = [n for n in nomes if self.curso_da_turma(n) == curso]
+        if nomes_turmas:
+            nomes_set = set(nomes_turmas)
+            nomes = [n for n in nomes if n in nomes_set]
+        return nomes
+
+    def filtrar_turmas(self, curso: str = None, nomes_turmas: Optional[List[str]] = None,
+                       processos: Optional[int] = None, tempo_limite: Optional[float] = None) -> Dict[str, AnalisadorAcademico]:
+        """Retorna os analisadores das turmas do curso e/ou da lista de nomes informados.
+        processos e tempo_limite sobrepõem, nesta chamada, os valores do gerenciador.
+        """
+        nomes = self.filtrar_nomes_turmas(curso, nomes_turmas)
+        processos = processos or self.processos_carregamento
+        tempo_limite = tempo_limite or self.tempo_limite_turma
+
+        if processos > 1 or tempo_limite:
+            return self.carregar_em_paralelo(nomes, processos, tempo_limite)
+
+        turmas_filtradas = {}
+        for nome_turma in nomes:
+            if self.falhou_carga(nome_turma):
+                continue
+            analisador = self.obter_turma(nome_turma)
+            if analisador is None:
+                self._registrar_falha(nome_turma)
+            else:
+                turmas_filtradas[nome_turma] = analisador
+        return turmas_filtradas
+    
+    def adicionar_ao_cubo(self, nome_turma: str, analisador: AnalisadorAcademico):
+        """Insere (ou substitui) no cubo o bloco de notas de uma turma"""
+        self.cubo.adicionar(nome_turma, analisador, self.curso_da_turma(nome_turma),
+                            self.extrair_ano_da_turma(nome_turma))
+
+    def filtrar_turmas_no_cubo(self, curso: str = None, nomes_turmas: Optional[List[str]] = None,
+                               processos: Optional[int] = None, tempo_limite: Optional[float] = None) -> List[str]:
+        """Nomes das turmas filtradas, garantindo que todas estejam no cubo.
+        Só as turmas que ainda não estão no cubo são carregadas; as que falharem ficam de fora.
+        """
+        nomes = self.filtrar_nomes_turmas(curso, nomes_turmas)
+        pendentes = [n for n in nomes if n not in self.cubo]
+        if pendentes:
+            for nome_turma, analisador in self.filtrar_turmas(nomes_turmas=pendentes, processos=processos,
+                                                              tempo_limite=tempo_limite).items():
+                self.adicionar_ao_cubo(nome_turma, analisador)
+        return [n for n in nomes if n in self.cubo]
+
+    def disciplinas_por_turma(self, curso: str = None) -> Dict[str, List[str]]:
+        """Disciplinas de cada turma, lidas do cubo (só as turmas que faltam nele são carregadas)"""
+        return self.cubo.disciplinas_turmas(self.filtrar_turmas_no_cubo(curso))
+
+    def comparar_turmas(self, curso: str = None, nomes_turmas: Optional[List[str]] = None,
+                        processos: Optional[int] = None, tempo_limite: Optional[float] = None) -> Dict[str, Any]:
         """Compara estatísticas entre turmas.
-        Pode filtrar por curso e/ou por lista específica de nomes de turmas.
+        Pode filtrar por curso e/ou por lista específica de nomes de turmas. As turmas que
+        faltam no cubo são carregadas em até `processos` processos; planilhas corrompidas ou
+        que passarem de `tempo_limite` segundos ficam fora da comparação.
         """
         if not self.turmas:
             return {'erro': 'Nenhuma turma disponível'}
         
-        # Filtrar turmas por curso e/ou nomes se especificado
-        turmas_filtradas = {}
-        base = self.turmas
-        if curso:
-            base = {n:a for n,a in base.items() if self.extrair_curso_da_turma(n) == curso}
-        if nomes_turmas:
-            nomes_set = set(nomes_turmas)
-            base = {n:a for n,a in base.items() if n in nomes_set}
-        turmas_filtradas = base
+        # Filtrar turmas por curso e/ou nomes (só as que faltam no cubo são carregadas)
+        turmas_filtradas = self.filtrar_turmas_no_cubo(curso, nomes_turmas, processos, tempo_limite)
         
         if not turmas_filtradas:
             return {'erro': f'Nenhuma turma encontrada para o curso {curso}'}
@@ -159,61 +951,25 @@ class GerenciadorTurmas:
         
         medias_turmas = []
         
-        for nome_turma, analisador in turmas_filtradas.items():
-            try:
-                relatorio = analisador.relatorio_geral_turma()
-
-                # Detectar trimestre atual
-                info_trimestre = analisador.detectar_trimestre_atual()
-
-                # Calcular aprovados/reprovados por disciplina
-                aprovados = 0
-                recuperacao = 0
-                reprovados = 0
-
-                for aluno in analisador.alunos:
-                    # Contar quantas disciplinas o aluno está reprovado
-                    disciplinas_reprovadas = 0
-                    disciplinas_recuperacao = 0
-                    disciplinas_aprovadas = 0
-
-                    for disciplina in analisador.disciplinas:
-                        media_disciplina = analisador.calcular_media_aluno(aluno, disciplina)
-                        if media_disciplina >= 6.0:
-                            disciplinas_aprovadas += 1
-                        elif media_disciplina >= 4.0:
-                            disciplinas_recuperacao += 1
-                        elif media_disciplina > 0:  # Só conta se tiver nota
-                            disciplinas_reprovadas += 1
-
-                    # Classificar o aluno baseado no pior cenário
-                    if disciplinas_reprovadas > 0:
-                        reprovados += 1
-                    elif disciplinas_recuperacao > 0:
-                        recuperacao += 1
-                    else:
-                        aprovados += 1
-
-                turma_info = {
-                    'nome': nome_turma,
-                    'curso': self.extrair_curso_da_turma(nome_turma),
-                    'total_alunos': len(analisador.alunos),
-                    'total_disciplinas': len(analisador.disciplinas),
-                    'media_geral': relatorio.get('media_geral_turma', 0),
-                    'aprovados': aprovados,
-                    'recuperacao': recuperacao,
-                    'reprovados': reprovados,
-                    'taxa_aprovacao': round((aprovados / len(analisador.alunos)) * 100, 1) if len(analisador.alunos) > 0 else 0,
-                    'trimestre_atual': info_trimestre.get('trimestre_atual', 1),
-                    'status_trimestre': info_trimestre.get('status', '1º Trimestre'),
-                    'trimestres_completos': info_trimestre.get('trimestres_completos', [])
-                }
-
-                comparacao['turmas'].append(turma_info)
-                medias_turmas.append((nome_turma, turma_info['media_geral']))
+        for resumo in self.cubo.resumo_turmas(turmas_filtradas):
+            nome_turma = resumo['nome']
+            turma_info = {
+                'nome': nome_turma,
+                'curso': self.curso_da_turma(nome_turma),
+                'total_alunos': resumo['total_alunos'],
+                'total_disciplinas': resumo['total_disciplinas'],
+                'media_geral': resumo['media_geral'],
+                'aprovados': resumo['aprovados'],
+                'recuperacao': resumo['recuperacao'],
+                'reprovados': resumo['reprovados'],
+                'taxa_aprovacao': round((resumo['aprovados'] / resumo['total_alunos']) * 100, 1) if resumo['total_alunos'] > 0 else 0,
+                'trimestre_atual': resumo['trimestre_atual'],
+                'status_trimestre': resumo['status_trimestre'],
+                'trimestres_completos': resumo['trimestres_completos']
+            }
 
-            except Exception as e:
-                print(f"Erro ao processar turma {nome_turma}: {e}")
+            comparacao['turmas'].append(turma_info)
+            medias_turmas.append((nome_turma, turma_info['media_geral']))
         
         # Ordenar turmas por média geral
         comparacao['turmas'].sort(key=lambda x: x['media_geral'], reverse=True)
@@ -226,59 +982,91 @@ class GerenciadorTurmas:
         
         return comparacao
     
-    def obter_ranking_disciplinas_geral(self, curso: str = None, nomes_turmas: Optional[List[str]] = None) -> Dict[str, Any]:
+    def simular_limites(self, limite_aprovacao: float = LIMITE_APROVACAO,
+                        limite_recuperacao: float = LIMITE_RECUPERACAO,
+                        limite_destaque: float = LIMITE_DESTAQUE,
+                        curso: str = None, nomes_turmas: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Reclassifica as turmas filtradas sob outros limites e soma as diferenças.
+        Usa as médias guardadas no cubo, sem carregar analisadores das turmas que já estão nele.
+        """
+        if limite_recuperacao > limite_aprovacao:
+            raise ValueError("O limite de recuperação não pode ser maior que o de aprovação")
+
+        turmas_filtradas = self.filtrar_turmas_no_cubo(curso, nomes_turmas)
+
+        if not turmas_filtradas:
+            return {'erro': f'Nenhuma turma encontrada para o curso {curso}' if curso else 'Nenhuma turma disponível'}
+
+        campos = ('total_alunos', 'aprovados', 'recuperacao', 'reprovados')
+        totais = {'atual': dict.fromkeys(campos, 0), 'simulado': dict.fromkeys(campos, 0)}
+        turmas = []
+
+        simulacoes = self.cubo.simular_limites(turmas_filtradas, limite_aprovacao, limite_recuperacao, limite_destaque)
+        for nome_turma, simulacao in simulacoes.items():
+            for cenario in totais:
+                for campo in campos:
+                    totais[cenario][campo] += simulacao[cenario][campo]
+
+            turmas.append({
+                'nome': nome_turma,
+                'curso': self.curso_da_turma(nome_turma),
+                'atual': simulacao['atual'],
+                'simulado': simulacao['simulado'],
+                'diferenca': simulacao['diferenca']
+            })
+
+        for resumo in totais.values():
+            resumo['taxa_aprovacao'] = round(resumo['aprovados'] / resumo['total_alunos'] * 100, 1) if resumo['total_alunos'] else 0
+
+        return {
+            'limites': {
+                'aprovacao': limite_aprovacao,
+                'recuperacao': limite_recuperacao,
+                'destaque': limite_destaque
+            },
+            'turmas': turmas,
+            'total_turmas': len(turmas),
+            'geral': {
+                'atual': totais['atual'],
+                'simulado': totais['simulado'],
+                'diferenca': diferenca_resumos(totais['atual'], totais['simulado'])
+            },
+            'curso_filtrado': curso
+        }
+
+    def obter_ranking_disciplinas_geral(self, curso: str = None, nomes_turmas: Optional[List[str]] = None,
+                                        ponderar: bool = False) -> Dict[str, Any]:
         """Ranking de disciplinas considerando turmas.
-        Pode filtrar por curso e/ou por lista específica de nomes de turmas.
+        Pode filtrar por curso e/ou por lista específica de nomes de turmas. Por padrão o
+        percentual de dificuldade é a média simples dos percentuais das turmas; com
+        ponderar=True é calculado sobre o total de alunos matriculados nas turmas.
         """
-        disciplinas_consolidadas = {}
-        
-        # Filtrar turmas por curso e/ou nomes
-        base = self.turmas
-        if curso:
-            base = {n:a for n,a in base.items() if self.extrair_curso_da_turma(n) == curso}
-        if nomes_turmas:
-            nomes_set = set(nomes_turmas)
-            base = {n:a for n,a in base.items() if n in nomes_set}
-        turmas_filtradas = base
-        
-        for nome_turma, analisador in turmas_filtradas.items():
-            try:
-                # CORREÇÃO: Usar o método correto
-                ranking_dificeis = analisador.ranking_disciplinas_dificeis()
-                
-                for disciplina_completa, percentual, total_com_dificuldade in ranking_dificeis:
-                    # Extrair nome da disciplina
-                    nome_disc = disciplina_completa.split(' - ')[1] if ' - ' in disciplina_completa else disciplina_completa
-                    
-                    if nome_disc not in disciplinas_consolidadas:
-                        disciplinas_consolidadas[nome_disc] = {
-                            'disciplina': nome_disc,
-                            'percentuais_dificuldade': [],
-                            'total_alunos': 0,
-                            'total_com_dificuldade': 0
-                        }
-                    
-                    # Calcular estatísticas da disciplina
-                    stats_disciplina = analisador.calcular_media_disciplina(disciplina_completa)
-                    total_alunos_disciplina = stats_disciplina['total_alunos']
-                    
-                    disciplinas_consolidadas[nome_disc]['percentuais_dificuldade'].append(percentual)
-                    disciplinas_consolidadas[nome_disc]['total_alunos'] += total_alunos_disciplina
-                    disciplinas_consolidadas[nome_disc]['total_com_dificuldade'] += total_com_dificuldade
-                    
-            except Exception as e:
-                print(f"Erro ao processar ranking da turma {nome_turma}: {e}")
-        
-        # Calcular médias consolidadas
+        # Filtrar turmas por curso e/ou nomes (só as que faltam no cubo são carregadas)
+        turmas_filtradas = self.filtrar_turmas_no_cubo(curso, nomes_turmas)
+
+        # Disciplinas na ordem em que aparecem nos rankings das turmas (desempate do ranking geral)
+        ordem_disciplinas = dict.fromkeys(
+            disciplina.split(' - ')[1] if ' - ' in disciplina else disciplina
+            for _, disciplina, _, _, _ in self.cubo.dificuldade_disciplinas(turmas_filtradas)
+        )
+        estatisticas = self.cubo.estatisticas_disciplinas(turmas_filtradas)
+
         ranking_geral = []
-        for nome_disc, dados in disciplinas_consolidadas.items():
-            percentual_medio = sum(dados['percentuais_dificuldade']) / len(dados['percentuais_dificuldade']) if dados['percentuais_dificuldade'] else 0
-            
+        for nome_disc in ordem_disciplinas:
+            dados = estatisticas[nome_disc]
+            if ponderar:
+                percentual = dados['com_dificuldade'] / dados['matriculados'] * 100 if dados['matriculados'] else 0
+            else:
+                percentual = dados['soma_percentuais'] / dados['total_turmas']
+
             ranking_geral.append({
                 'disciplina': nome_disc,
-                'percentual_dificuldade': round(percentual_medio, 1),
-                'total_alunos': dados['total_alunos'],
-                'total_com_dificuldade': dados['total_com_dificuldade']
+                'percentual_dificuldade': round(percentual, 1),
+                'total_alunos': dados['com_notas'],
+                'total_com_dificuldade': dados['com_dificuldade'],
+                'total_turmas': dados['total_turmas'],
+                'media_geral': round(dados['media_geral'], 2),
+                'desvio_padrao': round(dados['desvio_padrao'], 2)
             })
         
         # Ordenar por percentual de dificuldade (maior dificuldade primeiro)
@@ -288,62 +1076,27 @@ class GerenciadorTurmas:
             'disciplinas': ranking_geral,
             'total_disciplinas': len(ranking_geral),
             'turmas_analisadas': len(turmas_filtradas),
-            'curso_filtrado': curso
+            'curso_filtrado': curso,
+            'ponderado': ponderar
         }
     
     def obter_estatisticas_gerais(self, curso: str = None, nomes_turmas: Optional[List[str]] = None) -> Dict[str, Any]:
         """Estatísticas gerais de turmas.
         Pode filtrar por curso e/ou por lista específica de nomes de turmas.
         """
-        # Filtrar turmas por curso e/ou nomes
-        base = self.turmas
-        if curso:
-            base = {n:a for n,a in base.items() if self.extrair_curso_da_turma(n) == curso}
-        if nomes_turmas:
-            nomes_set = set(nomes_turmas)
-            base = {n:a for n,a in base.items() if n in nomes_set}
-        turmas_filtradas = base
+        # Filtrar turmas por curso e/ou nomes (só as que faltam no cubo são carregadas)
+        turmas_filtradas = self.filtrar_turmas_no_cubo(curso, nomes_turmas)
             
         if not turmas_filtradas:
             return {'erro': f'Nenhuma turma encontrada para o curso {curso}' if curso else 'Nenhuma turma disponível'}
         
-        total_alunos = 0
-        total_aprovados = 0
-        total_recuperacao = 0
-        total_reprovados = 0
-        medias_gerais = []
-        
-        for analisador in turmas_filtradas.values():
-            try:
-                relatorio = analisador.relatorio_geral_turma()
-                total_alunos += len(analisador.alunos)
-                medias_gerais.append(relatorio.get('media_geral_turma', 0))
-
-                # Calcular aprovados/reprovados por disciplina
-                for aluno in analisador.alunos:
-                    # Contar quantas disciplinas o aluno está reprovado
-                    disciplinas_reprovadas = 0
-                    disciplinas_recuperacao = 0
-
-                    for disciplina in analisador.disciplinas:
-                        media_disciplina = analisador.calcular_media_aluno(aluno, disciplina)
-                        if media_disciplina >= 6.0:
-                            pass  # Aprovado nesta disciplina
-                        elif media_disciplina >= 4.0:
-                            disciplinas_recuperacao += 1
-                        elif media_disciplina > 0:  # Só conta se tiver nota
-                            disciplinas_reprovadas += 1
-
-                    # Classificar o aluno baseado no pior cenário
-                    if disciplinas_reprovadas > 0:
-                        total_reprovados += 1
-                    elif disciplinas_recuperacao > 0:
-                        total_recuperacao += 1
-                    else:
-                        total_aprovados += 1
-
-            except Exception as e:
-                print(f"Erro ao processar estatísticas: {e}")
+        # Situação geral de cada aluno (pior situação entre as disciplinas com nota), somada por turma
+        resumos = self.cubo.resumo_turmas(turmas_filtradas)
+        total_alunos = sum(r['total_alunos'] for r in resumos)
+        total_aprovados = sum(r['aprovados'] for r in resumos)
+        total_recuperacao = sum(r['recuperacao'] for r in resumos)
+        total_reprovados = sum(r['reprovados'] for r in resumos)
+        medias_gerais = [r['media_geral'] for r in resumos]
         
         media_geral_escola = sum(medias_gerais) / len(medias_gerais) if medias_gerais else 0
         
@@ -18,8 +18,12 @@ function enviarPergunta(event) {
         })
         .then(response => response.json())
         .then(data => {
-            // Exibe a resposta do chatbot no chat
-            adicionarMensagem(data.resposta, 'bot');
+            // A resposta pode vir na hora (cache) ou como tarefa em segundo plano
+            if (data.tarefa) {
+                aguardarTarefa(data.tarefa);
+            } else {
+                adicionarMensagem(data.resposta || data.erro, 'bot');
+            }
         })
         .catch(error => {
             console.error('Erro:', error);
@@ -28,6 +32,22 @@ function enviarPergunta(event) {
     }
 }
 
+// Consulta a tarefa até a resposta ficar pronta
+function aguardarTarefa(idTarefa) {
+    fetch(`/api/tarefas/${idTarefa}`)
+        .then(response => response.json())
+        .then(tarefa => {
+            if (tarefa.status === 'concluida') {
+                adicionarMensagem(tarefa.resultado, 'bot');
+            } else if (tarefa.status === 'erro' || tarefa.erro) {
+                adicionarMensagem('Desculpe, houve um erro. Tente novamente.', 'bot');
+            } else {
+                setTimeout(() => aguardarTarefa(idTarefa), 1000);
+            }
+        })
+        .catch(() => adicionarMensagem('Desculpe, houve um erro. Tente novamente.', 'bot'));
+}
+
 function adicionarMensagem(mensagem, tipo) {
     const chatBox = document.getElementById('chat-box');
     const divMensagem = document.createElement('div');
@@ -0,0 +1,76 @@
+import hashlib
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analises_academicas import (AnalisadorAcademico, caminho_cache_planilha, gravar_cache_planilha, ler_cache_planilha,
+                                 ler_planilha, salvar_cache_planilha)
+
+
+def planilha_exemplo() -> pd.DataFrame:
+    return pd.DataFrame({
+        'Matrícula': [1001, 1002, 1003],
+        'Nome': ['ANA', None, 'CARLOS'],
+        'Disciplina': ['Disciplina - MATEMÁTICA', 'Disciplina - FÍSICA', 'Disciplina - MATEMÁTICA'],
+        'Nota 1º trimestre': [7.5, np.nan, 6.0],
+        'Ativo': [True, False, True]
+    })
+
+
+def test_cache_preserva_dtypes(tmp_path):
+    df = planilha_exemplo()
+    caminho_cache = str(tmp_path / '.cache' / 'turma.0123456789abcdef.npz')
+
+    salvar_cache_planilha(df, caminho_cache)
+    lido = ler_cache_planilha(caminho_cache)
+
+    pdt.assert_frame_equal(lido, df)
+    assert lido['Matrícula'].dtype == np.int64
+    assert lido['Ativo'].dtype == bool
+    assert lido['Matrícula'].tolist() == [1001, 1002, 1003]
+
+
+def test_cache_igual_a_planilha(tmp_path):
+    buffer = io.BytesIO()
+    planilha_exemplo().to_excel(buffer, index=False)
+    conteudo = buffer.getvalue()
+    caminho_planilha = str(tmp_path / 'turma.xlsx')
+    versao_dados = hashlib.sha256(conteudo).hexdigest()
+
+    # Primeira leitura pelo openpyxl; depois de gravado o cache, a segunda vem dele
+    do_excel, veio_do_cache = ler_planilha(caminho_planilha, conteudo, versao_dados)
+    assert not veio_do_cache
+    gravar_cache_planilha(caminho_planilha, do_excel, versao_dados)
+    assert os.path.exists(caminho_cache_planilha(caminho_planilha, versao_dados))
+    do_cache, veio_do_cache = ler_planilha(caminho_planilha, conteudo, versao_dados)
+    assert veio_do_cache
+
+    pdt.assert_series_equal(do_cache.dtypes, do_excel.dtypes)
+    pdt.assert_frame_equal(do_cache, do_excel)
+    assert do_cache['Matrícula'].iloc[0] == 1001 and str(do_cache['Matrícula'].iloc[0]) == '1001'
+
+
+def test_planilha_invalida_nao_troca_o_cache(tmp_path):
+    caminho_planilha = str(tmp_path / 'turma.xlsx')
+    valida = io.BytesIO()
+    planilha_exemplo().to_excel(valida, index=False)
+    analisador = AnalisadorAcademico(caminho_planilha, conteudo=valida.getvalue())
+    cache_atual = caminho_cache_planilha(caminho_planilha, analisador.versao_dados)
+    assert os.path.exists(cache_atual)
+
+    # Lida sem erro pelo openpyxl, mas sem a coluna Disciplina o analisador falha
+    invalida = io.BytesIO()
+    planilha_exemplo().drop(columns=['Disciplina']).to_excel(invalida, index=False)
+    with pytest.raises(KeyError):
+        AnalisadorAcademico(caminho_planilha, conteudo=invalida.getvalue())
+
+    versao_invalida = hashlib.sha256(invalida.getvalue()).hexdigest()
+    assert os.path.exists(cache_atual)
+    assert not os.path.exists(caminho_cache_planilha(caminho_planilha, versao_invalida))
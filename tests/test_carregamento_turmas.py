@@ -0,0 +1,63 @@
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gerenciador_turmas
+from gerenciador_turmas import GerenciadorTurmas
+
+PLANILHA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'turmas', 'info_a_2022.xlsx')
+
+# A carga lenta substitui _carregar_analisador no processo pai e chega aos processos de carga por fork
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                                reason='requer processos de carga criados por fork')
+
+
+def copiar_turmas(diretorio, quantidade: int):
+    for i in range(quantidade):
+        shutil.copy(PLANILHA, os.path.join(diretorio, f'info_a_{2001 + i}.xlsx'))
+
+
+def test_turmas_na_fila_nao_estouram_o_tempo_limite(tmp_path, monkeypatch):
+    copiar_turmas(tmp_path, 6)
+    carregar = gerenciador_turmas._carregar_analisador
+
+    def carga_lenta(caminho_arquivo, compacto):
+        time.sleep(0.3)
+        return carregar(caminho_arquivo, compacto)
+
+    monkeypatch.setattr(gerenciador_turmas, '_carregar_analisador', carga_lenta)
+    gerenciador = GerenciadorTurmas(str(tmp_path))
+    try:
+        # Com um processo, as 6 cargas somam mais que o tempo limite, mas cada uma cabe nele
+        turmas = gerenciador.carregar_em_paralelo(processos=1, tempo_limite=1.0)
+    finally:
+        gerenciador.encerrar()
+
+    assert len(turmas) == 6
+    assert gerenciador.falhas_carga == {}
+
+
+def test_turma_presa_nao_derruba_as_da_fila(tmp_path, monkeypatch):
+    copiar_turmas(tmp_path, 4)
+    carregar = gerenciador_turmas._carregar_analisador
+
+    def carga_presa(caminho_arquivo, compacto):
+        if caminho_arquivo.endswith('2001.xlsx'):
+            time.sleep(60)
+        return carregar(caminho_arquivo, compacto)
+
+    monkeypatch.setattr(gerenciador_turmas, '_carregar_analisador', carga_presa)
+    gerenciador = GerenciadorTurmas(str(tmp_path))
+    try:
+        turmas = gerenciador.carregar_em_paralelo(processos=1, tempo_limite=1.0)
+    finally:
+        gerenciador.encerrar()
+
+    assert sorted(turmas) == ['Info A 2002', 'Info A 2003', 'Info A 2004']
+    assert list(gerenciador.falhas_carga) == ['Info A 2001']